@@ -0,0 +1,171 @@
+# Non-interactive batch mode for the Completions API
+# Usage: python batch.py prompts.jsonl results.jsonl --concurrency 8
+import argparse  # For the command line interface
+import json  # For reading and writing JSONL files
+import random  # For jittered backoff between retries
+import time  # For timing and sleeping between retries
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait  # For bounded concurrency
+import openai  # OpenAI's Python client library for API interaction
+from dotenv import load_dotenv  # For loading environment variables from a .env file
+from tokens import UsageLedger  # Token accounting for the summary
+
+LANGUAGE_MODEL = "gpt-3.5-turbo-instruct"  # Define the model to use
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}  # Rate limits and server errors are retried
+
+
+def load_prompts(path: str) -> list:
+    """
+    Reads prompts from a JSONL file ({"id": ..., "prompt": ...} per line) or a plain text file (one prompt per line).
+
+    Returns:
+        list: (id, prompt) tuples in file order.
+    """
+    prompts = []
+    with open(path, encoding="utf-8") as file:
+        for line_number, line in enumerate(file, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            if path.endswith(".jsonl"):
+                record = json.loads(line)
+                prompts.append((record.get("id", line_number), record["prompt"]))
+            else:
+                prompts.append((line_number, line))
+    return prompts
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 20.0) -> float:
+    """Returns a full-jitter exponential backoff delay for a retry attempt."""
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+def complete(client, prompt: str, max_retries: int = 5, **params):
+    """
+    Sends a single completion request, retrying on 429/5xx and connection errors.
+
+    Returns:
+        tuple: (completion, number of attempts)
+    """
+    attempt = 0
+    while True:
+        try:
+            return client.completions.create(model=LANGUAGE_MODEL, prompt=prompt, **params), attempt + 1
+        except openai.APIStatusError as e:
+            if e.status_code not in RETRY_STATUS_CODES or attempt >= max_retries:
+                raise
+        except openai.APIConnectionError:
+            if attempt >= max_retries:
+                raise
+        time.sleep(backoff_delay(attempt))
+        attempt += 1
+
+
+def run_batch(client, prompts, output_path, concurrency=8, max_retries=5, **params) -> dict:
+    """
+    Runs prompts through a thread pool and appends each result to a JSONL file as soon as it completes.
+
+    At most 2 prompts per worker are submitted ahead of the results, so a
+    long input is not queued all at once. On Ctrl-C the prompts not started
+    yet are cancelled rather than run before the pool shuts down.
+
+    Returns:
+        dict: A summary with counts, throughput and token usage.
+    """
+    ledger = UsageLedger(LANGUAGE_MODEL)
+    succeeded = failed = retries = 0
+    started = time.perf_counter()
+
+    def worker(prompt):
+        request_started = time.perf_counter()
+        completion, attempts = complete(client, prompt, max_retries, **params)
+        return completion, attempts, time.perf_counter() - request_started
+
+    with open(output_path, "w", encoding="utf-8") as output, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        pending = {}  # future -> (id, prompt)
+        done = 0
+
+        def write_finished():
+            nonlocal succeeded, failed, retries, done
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                prompt_id, prompt = pending.pop(future)
+                try:
+                    completion, attempts, latency = future.result()
+                    response = completion.choices[0].text
+                    record = {
+                        "id": prompt_id,
+                        "prompt": prompt,
+                        "response": response,
+                        "usage": ledger.record(completion, prompt, response),
+                        "attempts": attempts,
+                        "latency": round(latency, 3),
+                    }
+                    succeeded += 1
+                    retries += attempts - 1
+                except Exception as e:
+                    record = {"id": prompt_id, "prompt": prompt, "error": str(e)}
+                    failed += 1
+
+                # Only this thread writes, so results land in completion order without locking
+                output.write(json.dumps(record) + "\n")
+                output.flush()
+
+                done += 1
+                elapsed = time.perf_counter() - started
+                print(f"\r[{done}/{len(prompts)}] {done / elapsed:.1f} prompts/s", end="", flush=True)
+
+        try:
+            for prompt_id, prompt in prompts:
+                if len(pending) >= 2 * concurrency:
+                    write_finished()
+                pending[pool.submit(worker, prompt)] = (prompt_id, prompt)
+            while pending:
+                write_finished()
+        except KeyboardInterrupt:
+            # requests already sent finish, the rest are dropped instead of waited for
+            for future in pending:
+                future.cancel()
+            raise
+
+    elapsed = time.perf_counter() - started
+    print()
+    return {
+        "prompts": len(prompts),
+        "succeeded": succeeded,
+        "failed": failed,
+        "retries": retries,
+        "elapsed": round(elapsed, 3),
+        "prompts_per_second": round(len(prompts) / elapsed, 2) if elapsed else 0.0,
+        "tokens_per_second": round(ledger.total_tokens / elapsed, 2) if elapsed else 0.0,
+        **ledger.summary(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a file of prompts through the Completions API")
+    parser.add_argument("input", help="JSONL ({'id', 'prompt'}) or text file with one prompt per line")
+    parser.add_argument("output", help="JSONL file the results are written to")
+    parser.add_argument("--concurrency", type=int, default=8, help="Maximum requests in flight")
+    parser.add_argument("--max-retries", type=int, default=5, help="Retries per prompt on 429/5xx")
+    parser.add_argument("--max-tokens", type=int, default=150, help="Maximum tokens per completion")
+    parser.add_argument("--base-url", default=None, help="API base URL, e.g. a local stand-in server")
+    args = parser.parse_args()
+
+    load_dotenv()
+    # Retries are handled by `complete()` so the client must not retry on its own
+    client = openai.OpenAI(base_url=args.base_url, max_retries=0)
+
+    prompts = load_prompts(args.input)
+    summary = run_batch(
+        client,
+        prompts,
+        args.output,
+        concurrency=args.concurrency,
+        max_retries=args.max_retries,
+        max_tokens=args.max_tokens,
+    )
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
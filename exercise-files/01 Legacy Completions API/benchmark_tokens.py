@@ -0,0 +1,49 @@
+# Micro-benchmark: token counting before and after the cached tokenizer
+import timeit  # For timing each approach
+import tiktoken  # For the original, uncached code path
+from tokens import count_tokens_batch, get_encoding, tokenize
+
+LANGUAGE_MODEL = "gpt-3.5-turbo-instruct"
+SAMPLE_ANSWER = (
+    "This is a test. The quick brown fox jumps over the lazy dog, "
+    "and the completions API returns a short answer to the question. "
+) * 4
+ANSWERS = [f"{SAMPLE_ANSWER} #{i}" for i in range(200)]
+REPEAT = 5
+
+
+def previous_path(text):
+    """The original `get_tokens()`: a fresh encoder lookup and two encodes per answer."""
+    encoding = tiktoken.get_encoding("cl100k_base")
+    token_integers = encoding.encode(text)
+    tokenized_input = list(
+        map(
+            lambda x: encoding.decode_single_token_bytes(x).decode("utf-8", errors="replace"),
+            encoding.encode(text),
+        )
+    )
+    return len(token_integers), tokenized_input
+
+
+def cached_path(text):
+    """The new path: cached encoder and a single encode per answer."""
+    token_integers, tokenized_input = tokenize(text, LANGUAGE_MODEL)
+    return len(token_integers), tokenized_input
+
+
+def report(name, seconds):
+    per_answer = seconds / (len(ANSWERS) * REPEAT) * 1e6
+    print(f"{name:<28} {seconds:8.3f}s  {per_answer:8.1f} µs/answer")
+
+
+if __name__ == "__main__":
+    get_encoding(LANGUAGE_MODEL)  # Load the BPE ranks before timing
+
+    print(f"{len(ANSWERS)} answers x {REPEAT} runs\n")
+    report("previous get_tokens()", timeit.timeit(lambda: [previous_path(a) for a in ANSWERS], number=REPEAT))
+    report("cached tokenize()", timeit.timeit(lambda: [cached_path(a) for a in ANSWERS], number=REPEAT))
+    report(
+        "count loop (cached)",
+        timeit.timeit(lambda: [len(get_encoding(LANGUAGE_MODEL).encode(a)) for a in ANSWERS], number=REPEAT),
+    )
+    report("count_tokens_batch()", timeit.timeit(lambda: count_tokens_batch(ANSWERS, LANGUAGE_MODEL), number=REPEAT))
@@ -1,10 +1,13 @@
 # https://platform.openai.com/docs/guides/text-generation/completions-api
 # Import necessary libraries
+import json  # For printing the metrics record
 import os  # For environment variable handling
+import time  # For timing streamed requests
 import openai  # OpenAI's Python client library for API interaction
-import tiktoken  # For token counting and encoding text
 from colorama import Fore  # For colored terminal text
 from dotenv import load_dotenv  # For loading environment variables from a .env file
+from streaming import build_metrics, consume_stream  # Token streaming and latency metrics
+from tokens import UsageLedger, get_encoding, tokenize  # Cached tokenizer and token accounting
 
 # Load the environment variables from a .env file to set up the OpenAI API client
 load_dotenv()
@@ -14,6 +17,8 @@ client = openai.OpenAI()  # Initialize the OpenAI client
 # Set up the language model and a test prompt
 LANGUAGE_MODEL = "gpt-3.5-turbo-instruct"  # Define the model to use
 PROMPT_TEST = "This is a test prompt. Say this is a test"  # Example prompt for testing purposes
+STREAM = True  # Print tokens as they arrive instead of waiting for the full completion
+ledger = UsageLedger(LANGUAGE_MODEL)  # Running token usage for this session
 
 def get_tokens(user_input: str) -> int:
     """
@@ -25,38 +30,68 @@ def get_tokens(user_input: str) -> int:
     Returns:
         int: The number of tokens in the provided text.
     """
-    encoding = tiktoken.get_encoding("cl100k_base")  # Use a specific encoding method
+    encoding = get_encoding(LANGUAGE_MODEL)  # Reuse the encoder cached for the model
 
-    token_integers = encoding.encode(user_input)  # Encode the input text into token integers
+    # Encode the input text once and decode each token integer into its string representation
+    token_integers, tokenized_input = tokenize(user_input, LANGUAGE_MODEL)
     tokens_usage = len(token_integers)  # Count the number of tokens used
 
-    # Decode each token integer into its string representation
-    tokenized_input = list(
-        map(
-            lambda x: encoding.decode_single_token_bytes(x).decode("utf-8"),
-            encoding.encode(user_input),
-        )
-    )
     # Display token usage details
     print(f"{encoding}: {tokens_usage} tokens")
     print(f"Token integers: {token_integers}")
     print(f"Token bytes: {tokenized_input}")
+    return tokens_usage
 
 def start():
     """Display the main menu and prompt the user for input."""
-    print("MENU")
-    print("====")
-    print("[1]- Ask a question")
-    print("[2]- Exit")
-    choice = input("Enter your choice: ")
-    if choice == "1":
-        ask()  # Proceed to ask a question
-    elif choice == "2":
-        exit()  # Exit the program
-    else:
-        print("Invalid choice")  # Handle invalid menu selections
+    # Loop instead of recursing so the stack does not grow with every menu round trip
+    while True:
+        print("MENU")
+        print("====")
+        print("[1]- Ask a question")
+        print("[2]- Exit")
+        choice = input("Enter your choice: ")
+        if choice == "1":
+            ask()  # Proceed to ask a question
+        elif choice == "2":
+            exit()  # Exit the program
+        else:
+            print("Invalid choice")  # Handle invalid menu selections
+
+def stream_answer(user_input: str):
+    """
+    Streams a completion to the terminal and measures its latency.
 
-def ask():
+    Args:
+        user_input (str): The question sent as the prompt.
+
+    Returns:
+        tuple: (response text, StreamMetrics)
+    """
+    started = time.perf_counter()
+    stream = client.completions.create(
+        model=LANGUAGE_MODEL,
+        prompt=str(user_input),
+        stream=True,
+    )
+    print(Fore.BLUE + "A: ", end="", flush=True)
+    response, _, time_to_first_token, total_latency, finish_reason = consume_stream(
+        stream,
+        lambda choice: (choice.text, choice.finish_reason),
+        on_text=lambda text: print(text, end="", flush=True),
+        started=started,
+    )
+    print(Fore.RESET)
+
+    # Streams carry no usage block, so the ledger counts the tokens locally
+    usage = ledger.record(None, user_input, response)
+    metrics = build_metrics(
+        LANGUAGE_MODEL, usage["completion_tokens"], time_to_first_token, total_latency, finish_reason
+    )
+    return response, metrics
+
+
+def ask(stream: bool = STREAM):
     """Prompt the user to ask a question and generate a response using the model."""
     instructions = (
         "Type your question and press ENTER. Type 'x' to go back to the MAIN menu.\n"
@@ -64,20 +99,25 @@ def ask():
     # Display instructions in blue italicized text
     print(Fore.BLUE + "\n\x1B[3m" + instructions + "\x1B[0m" + Fore.RESET)
 
-    user_input = input("Q: ")  # Capture user input as a question
-
     # Loop to handle user interactions until they choose to exit
     while True:
+        user_input = input("Q: ")  # Capture user input as a question
         if user_input == "x":  # Return to the main menu if 'x' is pressed
-            start()
+            return
+        elif stream:
+            response, metrics = stream_answer(user_input)
+            print(f"Metrics: {json.dumps(metrics.as_dict())}")
+            print(Fore.WHITE + "\n-------------------------------------------------")
         else:
             # Create a completion request using the selected language model
             completion = client.completions.create(
                 model=LANGUAGE_MODEL,
                 prompt=str(user_input)
             )
-            response = completion['choices'][0]['text']  # Extract the response text from the API response
+            response = completion.choices[0].text  # Extract the response text from the API response
             get_tokens(response)  # Calculate and display token usage
+            usage = ledger.record(completion, user_input, response)  # Prefer the API's usage block
+            print(f"Usage: {usage} | Session total: {ledger.total_tokens} tokens")
 
             # Display the model's response in blue text
             print(Fore.BLUE + f"A: " + response + Fore.RESET)
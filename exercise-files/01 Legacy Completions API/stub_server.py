@@ -0,0 +1,97 @@
+# Local stand-in for the Completions API, used to exercise batch.py without an API key
+# Usage: python stub_server.py --port 8000 --fail-rate 0.2
+#        python batch.py prompts.txt results.jsonl --base-url http://127.0.0.1:8000/v1
+import argparse  # For the command line interface
+import json  # For request and response bodies
+import random  # For injected failures
+import time  # For simulated latency
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class CompletionsHandler(BaseHTTPRequestHandler):
+    """Answers POST /v1/completions with an echo of the prompt, streamed when asked to."""
+
+    delay = 0.2  # Seconds of simulated model latency
+    fail_rate = 0.0  # Fraction of requests answered with a 429 or 503
+    token_delay = 0.05  # Seconds between streamed chunks
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(self.delay)
+
+        if random.random() < self.fail_rate:
+            status = random.choice([429, 503])
+            return self.send_json(status, {"error": {"message": f"stub error {status}", "type": "stub"}})
+
+        text = f" Echo: {body['prompt']}"
+        if body.get("stream"):
+            return self.send_stream(body["model"], text)
+
+        prompt_tokens = len(body["prompt"].split())
+        completion_tokens = len(text.split())
+        self.send_json(
+            200,
+            {
+                "id": "cmpl-stub",
+                "object": "text_completion",
+                "created": int(time.time()),
+                "model": body["model"],
+                "choices": [{"text": text, "index": 0, "logprobs": None, "finish_reason": "stop"}],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            },
+        )
+
+    def send_stream(self, model, text):
+        """Sends the text word by word as server-sent events, like `stream=True`."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        words = text.split(" ")
+        for index, word in enumerate(words):
+            last = index == len(words) - 1
+            chunk = {
+                "id": "cmpl-stub",
+                "object": "text_completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [
+                    {"text": word if index == 0 else " " + word, "index": 0, "logprobs": None,
+                     "finish_reason": "stop" if last else None}
+                ],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(self.token_delay)
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def send_json(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass  # Keep the console quiet under load
+
+
+def serve(port=8000, delay=0.2, fail_rate=0.0):
+    CompletionsHandler.delay = delay
+    CompletionsHandler.fail_rate = fail_rate
+    server = ThreadingHTTPServer(("127.0.0.1", port), CompletionsHandler)
+    print(f"Stub Completions API on http://127.0.0.1:{port}/v1")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the Completions API")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--delay", type=float, default=0.2, help="Seconds of simulated latency per request")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of requests answered with 429/503")
+    args = parser.parse_args()
+    serve(args.port, args.delay, args.fail_rate)
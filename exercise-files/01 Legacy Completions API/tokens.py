@@ -0,0 +1,119 @@
+# https://github.com/openai/tiktoken
+# Token accounting helpers shared by the completions CLI
+import functools  # For caching the encoder once per process
+import tiktoken  # For token counting and encoding text
+
+DEFAULT_ENCODING = "cl100k_base"  # Fallback encoding for models tiktoken does not know
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(model: str) -> tiktoken.Encoding:
+    """
+    Returns the tokenizer for a model, built once per process.
+
+    Args:
+        model (str): The model name, e.g. "gpt-3.5-turbo-instruct".
+
+    Returns:
+        tiktoken.Encoding: The cached encoding used by that model.
+    """
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding(DEFAULT_ENCODING)
+
+
+def count_tokens(text: str, model: str) -> int:
+    """Returns the number of tokens in a text string."""
+    return len(get_encoding(model).encode(text))
+
+
+def count_tokens_batch(texts: list, model: str, num_threads: int = 8) -> list:
+    """
+    Returns the number of tokens for many strings in a single call.
+
+    Args:
+        texts (list): The strings to count.
+        model (str): The model whose tokenizer should be used.
+        num_threads (int): Threads used by tiktoken's `encode_batch`.
+
+    Returns:
+        list: One token count per input string, in the same order.
+    """
+    encoded = get_encoding(model).encode_batch(texts, num_threads=num_threads)
+    return [len(token_integers) for token_integers in encoded]
+
+
+def tokenize(text: str, model: str) -> tuple:
+    """
+    Encodes a text string once and returns its token integers and token strings.
+
+    Args:
+        text (str): The text to tokenize.
+        model (str): The model whose tokenizer should be used.
+
+    Returns:
+        tuple: (token integers, decoded token strings)
+    """
+    encoding = get_encoding(model)
+    token_integers = encoding.encode(text)
+    token_strings = [
+        encoding.decode_single_token_bytes(token).decode("utf-8", errors="replace")
+        for token in token_integers
+    ]
+    return token_integers, token_strings
+
+
+class UsageLedger:
+    """Keeps a running total of the tokens used during a session."""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.requests = 0
+        self.estimated_requests = 0  # Requests counted locally because the API sent no usage
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def record(self, completion, prompt: str, response: str) -> dict:
+        """
+        Adds a request to the ledger.
+
+        The `usage` block returned by the API is preferred; the prompt and
+        response are only re-encoded locally when it is missing.
+
+        Returns:
+            dict: The prompt, completion and total tokens of this request.
+        """
+        usage = getattr(completion, "usage", None)
+        if usage is not None:
+            prompt_tokens = usage.prompt_tokens
+            completion_tokens = usage.completion_tokens
+        else:
+            prompt_tokens, completion_tokens = count_tokens_batch(
+                [prompt, response], self.model
+            )
+            self.estimated_requests += 1
+
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.requests += 1
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+    def summary(self) -> dict:
+        """Returns the totals for the session."""
+        return {
+            "model": self.model,
+            "requests": self.requests,
+            "estimated_requests": self.estimated_requests,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens,
+        }
@@ -0,0 +1,50 @@
+# Benchmark: prompt size per turn with the unbounded history vs the token-budgeted window
+import random
+import time
+from conversation import ConversationWindow, TOKENS_PER_REPLY, count_message_tokens
+
+MODEL_ENGINE = "gpt-3.5-turbo"
+MESSAGE_SYSTEM = "You are a helpful assistant"
+MAX_PROMPT_TOKENS = 3000
+TURNS = 500
+WORDS = "the a customer order refund shipping python token window latency budget model reply question answer".split()
+
+
+def synthetic_message(role, rng):
+    return {"role": role, "content": " ".join(rng.choice(WORDS) for _ in range(rng.randint(10, 80)))}
+
+
+def unbounded_prompt_tokens(history):
+    # what the original list-based CLI sends: every message, re-counted on every turn
+    return sum(count_message_tokens(message, MODEL_ENGINE) for message in history) + TOKENS_PER_REPLY
+
+
+if __name__ == "__main__":
+    rng = random.Random(0)
+    history = [{"role": "system", "content": MESSAGE_SYSTEM}]
+    window = ConversationWindow(MESSAGE_SYSTEM, max_prompt_tokens=MAX_PROMPT_TOKENS, model=MODEL_ENGINE)
+    unbounded_time = window_time = 0.0
+    window_sizes = []
+
+    print(f"{'turn':>5} {'unbounded':>10} {'window':>8}")
+    for turn in range(1, TURNS + 1):
+        for role in ("user", "assistant"):
+            message = synthetic_message(role, rng)
+            history.append(message)
+
+            started = time.perf_counter()
+            unbounded = unbounded_prompt_tokens(history)
+            unbounded_time += time.perf_counter() - started
+
+            started = time.perf_counter()
+            window.append(message)
+            windowed = window.prompt_tokens
+            window_time += time.perf_counter() - started
+        window_sizes.append(windowed)
+
+        if turn in (1, 10, 50, 100, 200, 300, 400, 500):
+            print(f"{turn:>5} {unbounded:>10} {windowed:>8}")
+
+    print(f"\nwindow prompt tokens over the last 400 turns: min {min(window_sizes[100:])}, max {max(window_sizes[100:])}")
+    print(f"messages evicted: {window.evicted}")
+    print(f"token accounting time: unbounded {unbounded_time:.3f}s, window {window_time:.3f}s")
@@ -0,0 +1,91 @@
+# https://github.com/openai/openai-cookbook/blob/main/examples/How_to_count_tokens_with_tiktoken.ipynb
+from collections import deque
+import functools
+import tiktoken
+
+# Every message is wrapped in <|start|>{role}\n{content}<|end|>\n and every reply is primed with <|start|>assistant
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(model):
+    """Returns the tokenizer for a model, built once per process"""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_message_tokens(message, model):
+    """Returns the number of prompt tokens a single chat message costs"""
+    encoding = get_encoding(model)
+    return TOKENS_PER_MESSAGE + sum(len(encoding.encode(value)) for value in message.values())
+
+
+class ConversationWindow:
+    """
+    Chat history kept under a prompt-token budget.
+
+    The system prompt is always sent first. When the history goes over
+    `max_prompt_tokens`, the oldest turns are evicted until it is back under
+    `low_water` of the budget, so eviction happens in batches rather than on
+    every turn. If a `summarize` callable is given, evicted turns are folded
+    into a running summary message instead of being dropped.
+    """
+
+    def __init__(self, system_prompt, max_prompt_tokens=3000, model="gpt-3.5-turbo", summarize=None, low_water=0.75):
+        self.model = model
+        self.max_prompt_tokens = max_prompt_tokens
+        self.low_water = low_water
+        self.summarize = summarize  # summarize(previous_summary, evicted_messages) -> str
+        self.system = self._entry({"role": "system", "content": system_prompt})
+        self.summary = None
+        self.turns = deque()  # (message, token count) pairs, oldest first
+        self.turn_tokens = 0
+        self.evicted = 0
+
+    def _entry(self, message):
+        # each message is counted once, when it enters the window
+        return message, count_message_tokens(message, self.model)
+
+    @property
+    def prompt_tokens(self):
+        """Tokens the next request will send, including reply priming"""
+        summary_tokens = self.summary[1] if self.summary else 0
+        return self.system[1] + summary_tokens + self.turn_tokens + TOKENS_PER_REPLY
+
+    @property
+    def messages(self):
+        """The messages to send to the Chat Completions API"""
+        pinned = [self.system[0]] + ([self.summary[0]] if self.summary else [])
+        return pinned + [message for message, _ in self.turns]
+
+    def append(self, message):
+        """Adds a message, e.g. {"role": "user", "content": "..."}, and trims the oldest turns if needed"""
+        message = {"role": message["role"], "content": message["content"] or ""}
+        entry = self._entry(message)
+        self.turns.append(entry)
+        self.turn_tokens += entry[1]
+        if self.prompt_tokens > self.max_prompt_tokens:
+            self._trim()
+
+    def _trim(self):
+        target = int(self.max_prompt_tokens * self.low_water)
+        evicted = []
+        # the newest message is always kept so the model sees the question it has to answer
+        while len(self.turns) > 1 and self.prompt_tokens > target:
+            message, tokens = self.turns.popleft()
+            self.turn_tokens -= tokens
+            evicted.append(message)
+        # never start the history with a reply whose question was evicted
+        while len(self.turns) > 1 and self.turns[0][0]["role"] == "assistant":
+            message, tokens = self.turns.popleft()
+            self.turn_tokens -= tokens
+            evicted.append(message)
+        self.evicted += len(evicted)
+
+        if self.summarize and evicted:
+            previous = self.summary[0]["content"] if self.summary else ""
+            text = self.summarize(previous, evicted)
+            self.summary = self._entry({"role": "system", "content": f"Summary of the earlier conversation: {text}"})
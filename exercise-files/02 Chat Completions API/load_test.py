@@ -0,0 +1,63 @@
+# Load test for the async chat engine against a local fake endpoint
+# Usage: python load_test.py --sessions 300 --turns 5
+import argparse
+import asyncio
+import statistics
+import time
+from engine import ChatEngine
+from stub_server import StubServer
+
+MODEL_ENGINE = "gpt-3.5-turbo"
+MESSAGE_SYSTEM = "You are a helpful assistant"
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def run_session(engine, session_id, turns, latencies, stream):
+    for turn in range(turns):
+        started = time.perf_counter()
+        if stream:
+            await engine.stream_reply(session_id, f"session {session_id} turn {turn}")
+        else:
+            await engine.reply(session_id, f"session {session_id} turn {turn}")
+        latencies.append(time.perf_counter() - started)
+
+
+async def load_test(base_url, sessions, turns, max_concurrency, stream, delay):
+    if base_url is None:
+        stub = StubServer(delay)
+        port = await stub.start(0)  # port 0 picks a free port
+        base_url = f"http://127.0.0.1:{port}/v1"
+
+    engine = ChatEngine(
+        MODEL_ENGINE, MESSAGE_SYSTEM, max_concurrency=max_concurrency, base_url=base_url, max_tokens=150
+    )
+    latencies = []
+    started = time.perf_counter()
+    await asyncio.gather(*(run_session(engine, i, turns, latencies, stream) for i in range(sessions)))
+    elapsed = time.perf_counter() - started
+    await engine.aclose()
+
+    assert all(len(engine.sessions[i].messages) == 1 + 2 * turns for i in range(sessions)), "sessions got mixed up"
+    print(f"sessions:      {sessions} x {turns} turns ({'streamed' if stream else 'blocking'})")
+    print(f"requests:      {len(latencies)} in {elapsed:.2f}s")
+    print(f"requests/sec:  {len(latencies) / elapsed:.1f}")
+    print(f"latency p50:   {statistics.median(latencies) * 1000:.0f} ms")
+    print(f"latency p95:   {percentile(latencies, 0.95) * 1000:.0f} ms")
+    print(f"latency max:   {max(latencies) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the async chat engine")
+    parser.add_argument("--sessions", type=int, default=300)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--max-concurrency", type=int, default=50, help="requests in flight / pooled connections")
+    parser.add_argument("--delay", type=float, default=0.2, help="simulated latency of the fake endpoint")
+    parser.add_argument("--stream", action="store_true", help="use streamed replies")
+    parser.add_argument("--base-url", default=None, help="use an already running endpoint instead of the built-in fake")
+    args = parser.parse_args()
+
+    asyncio.run(load_test(args.base_url, args.sessions, args.turns, args.max_concurrency, args.stream, args.delay))
@@ -1,17 +1,67 @@
 # https://platform.openai.com/docs/guides/text-generation/chat-completions-api
+import json
+import uuid
 import openai
 from dotenv import load_dotenv
 from colorama import Fore
+from conversation import ConversationWindow, count_message_tokens, get_encoding
+from engine import BackgroundLoop, ChatEngine
+from store import ConversationStore
 
 
 # Constants
 MODEL_ENGINE = "gpt-3.5-turbo"
 MESSAGE_SYSTEM = "You are a helpful assistant"
-messages = [{"role": "system", "content": MESSAGE_SYSTEM}]
+STREAM = True  # print tokens as they arrive instead of waiting for the full reply
+MAX_PROMPT_TOKENS = 3000  # oldest turns are evicted once the prompt would grow past this
+SUMMARIZE_EVICTED = False  # fold evicted turns into a summary (one extra request per eviction batch)
+STORE_PATH = "conversations.db"  # chats are saved here and can be resumed after a restart
 
 load_dotenv()
 client = openai.OpenAI()
 
+
+def summarize_turns(previous_summary, evicted):
+    """Condenses evicted turns (and the previous summary) into a short summary"""
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in evicted)
+    response = client.chat.completions.create(
+        model=MODEL_ENGINE,
+        messages=[
+            {"role": "system", "content": "Summarize this conversation in under 100 words, keeping names, facts and decisions."},
+            {"role": "user", "content": f"{previous_summary}\n{transcript}"},
+        ],
+        temperature=0,
+        max_tokens=150,
+    )
+    return response.choices[0].message.content
+
+
+def new_conversation(system_prompt):
+    return ConversationWindow(
+        system_prompt,
+        max_prompt_tokens=MAX_PROMPT_TOKENS,
+        model=MODEL_ENGINE,
+        summarize=summarize_turns if SUMMARIZE_EVICTED else None,
+    )
+
+
+store = ConversationStore(
+    STORE_PATH, count_tokens=lambda content: count_message_tokens({"content": content}, MODEL_ENGINE)
+)
+
+# one engine (and one pooled HTTP client) for every chat session in the process
+engine = ChatEngine(
+    MODEL_ENGINE,
+    MESSAGE_SYSTEM,
+    conversation_factory=new_conversation,
+    store=store,
+    count_tokens=lambda text: len(get_encoding(MODEL_ENGINE).encode(text)),
+    history_tokens=MAX_PROMPT_TOKENS,  # a resumed chat only loads the turns that fit the window
+    temperature=1, #Lower values for temperature result in more consistent outputs (e.g. 0.2), while higher values generate more diverse and creative results (e.g. 1.0). The temperature can range is from 0 to 2.
+    max_tokens=150, #model token output
+)
+loop = BackgroundLoop()
+
 # response object:
 # {
 #   "choices": [
@@ -36,17 +86,18 @@ client = openai.OpenAI()
 #   }
 # }
 
-def generate_chat_completion(user_input=""):
-    messages.append({"role": "user", "content": user_input})
-    response = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=messages,
-        temperature=1, #Lower values for temperature result in more consistent outputs (e.g. 0.2), while higher values generate more diverse and creative results (e.g. 1.0). The temperature can range is from 0 to 2.
-        max_tokens=150, #model token output
-    )
-    message_returned = response.choices[0].message
-    messages.append(message_returned) # we want the role: assistant & content: response back fed back in
-    print(Fore.GREEN + "Bot: " + message_returned.content)
+def generate_chat_completion(session_id, user_input="", stream=STREAM):
+    if stream:
+        print(Fore.GREEN + "Bot: ", end="", flush=True)
+        _, metrics = loop.run(
+            engine.stream_reply(session_id, user_input, on_text=lambda text: print(text, end="", flush=True))
+        )
+        print()
+        print(Fore.WHITE + f"Metrics: {json.dumps(metrics.as_dict())}")
+        return metrics
+    content = loop.run(engine.reply(session_id, user_input))
+    print(Fore.GREEN + "Bot: " + content)
+
 
 def main():
     while True:
@@ -56,32 +107,61 @@ def main():
         print("\n----------------------------------------")
         print("\n================* MENU *================\n")
         print("[1]- Start Chat")
-        print("[2]- Exit")
+        print("[2]- Resume Last Chat")
+        print("[3]- Exit")
         choice = input("Enter your choice: ")
         if choice == "1":
             start_chat()
         elif choice == "2":
+            resume_chat()
+        elif choice == "3":
             exit()
         else:
             print("Invalid choice")
 
 
-def start_chat():
-    print("to end chat, type 'x'")
+def print_history(messages):
+    for message in messages:
+        role = "Bot" if message["role"] == "assistant" else "You"
+        print(Fore.CYAN + f"{role}: {message['content']}")
+
+
+def start_chat(session_id=None, oldest_shown=None):
+    print("to end chat, type 'x'; to show older messages, type '/more'")
     print("\n")
-    print("      NEW CHAT       ")
+    print("      NEW CHAT       " if session_id is None else "    RESUMED CHAT     ")
     print("---------------------")
-    generate_chat_completion()
+    session_id = session_id or uuid.uuid4().hex
+    # older turns are only read from the store when asked for
+    if oldest_shown is None:
+        oldest_shown = store.length(session_id)
 
     while True:
         user_input = input(Fore.WHITE + "You: ")
 
         if user_input.lower() == "x":
-            main()
+            engine.drop_session(session_id)
             break
+        elif user_input == "/more":
+            older = store.before(session_id, oldest_shown, limit=10)
+            if not older:
+                print(Fore.CYAN + "(start of conversation)")
+                continue
+            print_history(older)
+            oldest_shown = older[0]["seq"]
         else:
-            pass
-            # generate
+            generate_chat_completion(session_id, user_input)
+
+
+def resume_chat():
+    sessions = store.recent_sessions(limit=1)
+    if not sessions:
+        print("No saved chats")
+        return
+    session_id = sessions[0]
+    recent = store.tail(session_id, limit=4)
+    print_history(recent)
+    start_chat(session_id, oldest_shown=recent[0]["seq"] if recent else None)
 
 
 if __name__ == "__main__":
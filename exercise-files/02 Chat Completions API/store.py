@@ -0,0 +1,138 @@
+# https://www.sqlite.org/wal.html
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    next_seq INTEGER NOT NULL,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    tokens INTEGER NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (session_id, seq)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS sessions_by_update ON sessions (updated);
+"""
+
+
+def estimate_tokens(content):
+    """Rough token count (~4 characters per token plus per-message overhead) used when no tokenizer is given"""
+    return len(content) // 4 + 4
+
+
+class ConversationStore:
+    """
+    Append-only, durable chat history in a SQLite database in WAL mode.
+
+    Messages are never rewritten: each one gets the next sequence number of its
+    session and is stored with its token count, so a conversation can be
+    reloaded from the newest turn backwards without reading the whole history.
+    Appends touch one session row and one index leaf, whatever the length of
+    the conversation. Safe to use from several threads.
+    """
+
+    def __init__(self, path="conversations.db", count_tokens=estimate_tokens):
+        self.path = path
+        self.count_tokens = count_tokens
+        self.local = threading.local()
+        self.write_lock = threading.Lock()
+        self.conn.executescript(SCHEMA)
+
+    @property
+    def conn(self):
+        # one connection per thread; WAL lets readers run while another thread appends
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def append(self, session_id, role, content):
+        """Adds a message at the end of a session and returns its sequence number"""
+        now = time.time()
+        with self.write_lock, self.conn as conn:
+            row = conn.execute("SELECT next_seq FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            seq = row[0] if row else 0
+            conn.execute(
+                "INSERT INTO sessions (session_id, next_seq, created, updated) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (session_id) DO UPDATE SET next_seq = excluded.next_seq, updated = excluded.updated",
+                (session_id, seq + 1, now, now),
+            )
+            conn.execute(
+                "INSERT INTO messages (session_id, seq, role, content, tokens, created) VALUES (?, ?, ?, ?, ?, ?)",
+                (session_id, seq, role, content, self.count_tokens(content), now),
+            )
+        return seq
+
+    def tail(self, session_id, max_tokens=None, limit=None):
+        """
+        Returns the newest messages of a session, oldest first.
+
+        Reads backwards from the last message and stops once `max_tokens` or
+        `limit` would be exceeded. Each message is a dict with role, content
+        and seq, so older turns can be paged in with `before()`.
+        """
+        messages = []
+        used = 0
+        cursor = self.conn.execute(
+            "SELECT seq, role, content, tokens FROM messages WHERE session_id = ? ORDER BY seq DESC",
+            (session_id,),
+        )
+        for seq, role, content, tokens in cursor:
+            if limit is not None and len(messages) >= limit:
+                break
+            if max_tokens is not None and used + tokens > max_tokens and messages:
+                break
+            used += tokens
+            messages.append({"role": role, "content": content, "seq": seq})
+        cursor.close()
+        messages.reverse()
+        return messages
+
+    def before(self, session_id, seq, limit=20):
+        """Returns up to `limit` messages older than `seq`, oldest first"""
+        rows = self.conn.execute(
+            "SELECT seq, role, content FROM messages WHERE session_id = ? AND seq < ? ORDER BY seq DESC LIMIT ?",
+            (session_id, seq, limit),
+        ).fetchall()
+        return [{"role": role, "content": content, "seq": seq} for seq, role, content in reversed(rows)]
+
+    def length(self, session_id):
+        """Number of messages stored for a session"""
+        row = self.conn.execute("SELECT next_seq FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return row[0] if row else 0
+
+    def recent_sessions(self, limit=10):
+        """Session ids, most recently updated first"""
+        rows = self.conn.execute("SELECT session_id FROM sessions ORDER BY updated DESC LIMIT ?", (limit,))
+        return [session_id for (session_id,) in rows]
+
+
+class PersistentConversation:
+    """Wraps a conversation object so every appended message is also written to a ConversationStore"""
+
+    def __init__(self, store, session_id, conversation, max_tokens=None):
+        self.store = store
+        self.session_id = session_id
+        self.conversation = conversation
+        # only the tail that fits the prompt budget is loaded; older turns stay on disk
+        for message in store.tail(session_id, max_tokens=max_tokens):
+            conversation.append(message)
+
+    @property
+    def messages(self):
+        return self.conversation.messages
+
+    def append(self, message):
+        self.store.append(self.session_id, message["role"], message["content"] or "")
+        self.conversation.append(message)
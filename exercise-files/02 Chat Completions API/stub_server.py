@@ -0,0 +1,110 @@
+# Local stand-in for the Chat Completions API, used by load_test.py and for running without an API key
+# Usage: python stub_server.py --port 8000
+import argparse
+import asyncio
+import json
+import time
+
+
+class StubServer:
+    """
+    Answers POST /v1/chat/completions by echoing the last user message, streamed when asked to.
+
+    Built on asyncio streams with HTTP/1.1 keep-alive so it can hold hundreds of
+    concurrent connections without a thread per client.
+    """
+
+    def __init__(self, delay=0.2, token_delay=0.02):
+        self.delay = delay  # seconds of simulated model latency
+        self.token_delay = token_delay  # seconds between streamed chunks
+        self.requests = 0
+
+    async def start(self, port=8000):
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", port, backlog=1024)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                headers = dict(
+                    line.split(": ", 1) for line in head.decode("latin-1").split("\r\n")[1:] if ": " in line
+                )
+                length = int(next((v for k, v in headers.items() if k.lower() == "content-length"), 0))
+                body = json.loads(await reader.readexactly(length))
+                self.requests += 1
+                await asyncio.sleep(self.delay)
+                await self.respond(writer, body)
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, body):
+        text = "Echo: " + body["messages"][-1]["content"]
+        if body.get("stream"):
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n"
+            )
+            words = text.split(" ")
+            for index, word in enumerate(words):
+                last = index == len(words) - 1
+                chunk = {
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": body["model"],
+                    "choices": [
+                        {"index": 0, "delta": {"content": word if index == 0 else " " + word},
+                         "finish_reason": "stop" if last else None}
+                    ],
+                }
+                self.write_chunk(writer, f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                await writer.drain()
+                await asyncio.sleep(self.token_delay)
+            self.write_chunk(writer, b"data: [DONE]\n\n")
+            self.write_chunk(writer, b"")
+            return await writer.drain()
+
+        prompt_tokens = sum(len(m["content"].split()) for m in body["messages"])
+        completion_tokens = len(text.split())
+        data = json.dumps(
+            {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body["model"],
+                "choices": [
+                    {"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}
+                ],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            }
+        ).encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n".encode("ascii")
+            + data
+        )
+        await writer.drain()
+
+    @staticmethod
+    def write_chunk(writer, data):
+        writer.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+
+
+async def serve(port, delay):
+    stub = StubServer(delay)
+    port = await stub.start(port)
+    print(f"Stub Chat Completions API on http://127.0.0.1:{port}/v1")
+    await stub.server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the Chat Completions API")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--delay", type=float, default=0.2, help="seconds of simulated latency per request")
+    args = parser.parse_args()
+    asyncio.run(serve(args.port, args.delay))
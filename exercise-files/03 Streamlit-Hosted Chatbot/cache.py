@@ -0,0 +1,181 @@
+from collections import OrderedDict
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    content TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_by_access ON responses (last_access);
+"""
+
+# Parameters that change what the model returns; anything else (e.g. stream) is left out of the key
+SAMPLING_PARAMS = (
+    "temperature", "top_p", "max_tokens", "frequency_penalty", "presence_penalty", "stop", "seed", "n",
+    "functions", "function_call", "tools", "tool_choice", "response_format", "logit_bias",
+)
+
+
+class ResponseCache:
+    """
+    Exact-match cache for chat completions.
+
+    The key is a SHA-256 of the model, the messages (role and content) and the
+    sampling parameters, serialized canonically. Lookups go to an in-memory
+    LRU first, then to a SQLite file that is trimmed back to `max_bytes`
+    (least recently used first) and whose entries expire after `ttl` seconds.
+
+    Only deterministic requests (temperature 0) are cached, unless
+    `cache_nondeterministic` is set: with a higher temperature the caller
+    expects a different reply every time.
+    """
+
+    def __init__(
+        self,
+        path="responses.db",
+        memory_items=256,
+        max_bytes=50 * 1024 * 1024,
+        ttl=24 * 60 * 60,
+        cache_nondeterministic=False,
+    ):
+        self.path = path
+        self.memory_items = memory_items
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.cache_nondeterministic = cache_nondeterministic
+        self.memory = OrderedDict()  # key -> (content, created), least recently used first
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.conn.executescript(SCHEMA)
+        self.disk_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "bypassed": 0, "evictions": 0}
+
+    @property
+    def conn(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self.local.conn = conn
+        return conn
+
+    @staticmethod
+    def key(model, messages, **params):
+        """Canonical hash of a chat completion request"""
+        request = {
+            "model": model,
+            "messages": [{"role": m["role"], "content": m["content"]} for m in messages],
+            "params": {name: params[name] for name in SAMPLING_PARAMS if params.get(name) is not None},
+        }
+        canonical = json.dumps(request, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def cacheable(self, **params):
+        # the API defaults to temperature 1, so a request without one is not deterministic either
+        if params.get("n", 1) != 1:
+            return False
+        return self.cache_nondeterministic or params.get("temperature", 1) == 0
+
+    def get(self, key):
+        """Returns the cached reply for a key, or None"""
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None and now - entry[1] <= self.ttl:
+                self.memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return entry[0]
+            self.memory.pop(key, None)
+
+        row = self.conn.execute("SELECT content, created FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None or now - row[1] > self.ttl:
+            with self.lock:
+                self.counters["misses"] += 1
+            return None
+        with self.conn as conn:
+            conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+        with self.lock:
+            self.counters["disk_hits"] += 1
+            self._remember(key, row[0], row[1])
+        return row[0]
+
+    def put(self, key, content):
+        now = time.time()
+        size = len(content.encode("utf-8"))
+        with self.lock:
+            self._remember(key, content, now)
+        with self.conn as conn:
+            previous = conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, content, size, created, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, content, size, now, now),
+            )
+        with self.lock:
+            self.disk_bytes += size - (previous[0] if previous else 0)
+        if self.disk_bytes > self.max_bytes:
+            self._evict(now)
+
+    def _remember(self, key, content, created):
+        self.memory[key] = (content, created)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_items:
+            self.memory.popitem(last=False)
+
+    def _evict(self, now):
+        """Drops expired entries, then the least recently used ones until the file is back under 90% of max_bytes"""
+        with self.conn as conn:
+            conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            evicted = []
+            for key, size in conn.execute("SELECT key, size FROM responses ORDER BY last_access").fetchall():
+                if total <= self.max_bytes * 0.9:
+                    break
+                evicted.append((key,))
+                total -= size
+            conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
+        with self.lock:
+            self.disk_bytes = total
+            self.counters["evictions"] += len(evicted)
+            for (key,) in evicted:
+                self.memory.pop(key, None)
+
+    def lookup(self, model, messages, **params):
+        """
+        Returns (key, cached reply) for a request.
+
+        The key is None when the request is not cacheable, and the reply is
+        None on a miss; store the fresh reply with `put(key, reply)`.
+        """
+        if not self.cacheable(**params):
+            with self.lock:
+                self.counters["bypassed"] += 1
+            return None, None
+        key = self.key(model, messages, **params)
+        return key, self.get(key)
+
+    def create(self, client, model, messages, **params):
+        """Calls `client.chat.completions.create` through the cache and returns the reply text"""
+        key, content = self.lookup(model, messages, **params)
+        if content is None:
+            content = client.chat.completions.create(model=model, messages=messages, **params).choices[0].message.content
+            if key is not None:
+                self.put(key, content)
+        return content
+
+    def stats(self):
+        with self.lock:
+            lookups = self.counters["memory_hits"] + self.counters["disk_hits"] + self.counters["misses"]
+            hits = self.counters["memory_hits"] + self.counters["disk_hits"]
+            return {
+                **self.counters,
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+                "memory_entries": len(self.memory),
+                "disk_bytes": self.disk_bytes,
+            }
@@ -0,0 +1,232 @@
+# https://github.com/openai/openai-python#async-usage
+# A copy of the engine in 02 Chat Completions API (exercise folders do not import each other),
+# with a session store and a response cache in place of the persistent store there;
+# changes to how a turn is sent and committed go into both copies.
+import asyncio
+import queue
+import threading
+import time
+import weakref
+import httpx
+import openai
+from sessions import SessionStore
+from streaming import build_metrics, consume_async_stream
+
+
+def estimate_tokens(text):
+    """Rough token count of a reply (~4 characters per token) used when no tokenizer is given"""
+    return (len(text) + 3) // 4
+
+
+class Conversation:
+    """Unbounded chat history with the system prompt pinned first"""
+
+    def __init__(self, system_prompt):
+        self.messages = [{"role": "system", "content": system_prompt}]
+
+    def append(self, message):
+        self.messages.append({"role": message["role"], "content": message["content"] or ""})
+
+
+class ChatEngine:
+    """
+    Serves many chat sessions from one process with a single AsyncOpenAI client.
+
+    Every session has its own conversation object, created on first use by
+    `conversation_factory(system_prompt)`. All requests share one pooled set of
+    HTTP connections, and at most `max_concurrency` requests are in flight at
+    once. Turns within a session run one after another; turns of different
+    sessions run concurrently.
+
+    Sessions live in `sessions`, a SessionStore that expires idle sessions and
+    evicts the least recently used ones. With a `cache` (a ResponseCache),
+    a request identical to an earlier one is answered from the cache.
+    Stream metrics count the reply's tokens with `count_tokens(text)`, pass a
+    tokenizer for exact counts (the default estimates ~4 characters per token).
+    """
+
+    def __init__(
+        self,
+        model,
+        system_prompt,
+        conversation_factory=Conversation,
+        max_concurrency=50,
+        client=None,
+        base_url=None,
+        timeout=60.0,
+        sessions=None,
+        cache=None,
+        count_tokens=estimate_tokens,
+        **defaults,
+    ):
+        self.model = model
+        self.system_prompt = system_prompt
+        self.conversation_factory = conversation_factory
+        self.defaults = defaults  # sampling parameters sent with every request, e.g. temperature, max_tokens
+        self.count_tokens = count_tokens  # text -> tokens, for the completion_tokens of stream metrics
+        self.client = client or openai.AsyncOpenAI(
+            base_url=base_url,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+                timeout=httpx.Timeout(timeout, connect=5.0),
+            ),
+        )
+        self.cache = cache
+        self.sessions = sessions if sessions is not None else SessionStore()
+        # locks are tied to the conversation object, so they go away when its session is evicted
+        self.locks = weakref.WeakKeyDictionary()
+        self.max_concurrency = max_concurrency
+        self._semaphore = None  # created lazily so it binds to the loop that runs the engine
+
+    def get_session(self, session_id):
+        """Returns the conversation of a session, creating it if needed"""
+        conversation = self.sessions.get_or_create(session_id, lambda: self.conversation_factory(self.system_prompt))
+        if conversation not in self.locks:
+            self.locks[conversation] = asyncio.Lock()
+        return conversation
+
+    def drop_session(self, session_id):
+        self.sessions.pop(session_id)
+
+    @property
+    def semaphore(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def cached_reply(self, messages, params):
+        """Returns (cache key, cached reply); both are None without a cache"""
+        if self.cache is None:
+            return None, None
+        return await asyncio.to_thread(self.cache.lookup, self.model, messages, **params)
+
+    async def remember_reply(self, key, content):
+        if key is not None:
+            await asyncio.to_thread(self.cache.put, key, content)
+
+    @staticmethod
+    async def commit_turn(conversation, user_input, content):
+        """Appends a user message and its reply together"""
+
+        def append_both():
+            conversation.append({"role": "user", "content": user_input})
+            conversation.append({"role": "assistant", "content": content})
+
+        # appends count tokens (and may summarize), so keep them off the event loop
+        await asyncio.to_thread(append_both)
+
+    async def reply(self, session_id, user_input, **params):
+        """
+        Sends a user message in a session and returns the assistant's reply.
+
+        The message and the reply are added to the conversation together once
+        the reply has arrived, so a failed request leaves it as it was.
+        """
+        conversation = self.get_session(session_id)
+        async with self.locks[conversation]:
+            messages = conversation.messages + [{"role": "user", "content": user_input}]
+            params = {**self.defaults, **params}
+            key, content = await self.cached_reply(messages, params)
+            if content is None:
+                async with self.semaphore:
+                    completion = await self.client.chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        **params,
+                    )
+                content = completion.choices[0].message.content
+                await self.remember_reply(key, content)
+            await self.commit_turn(conversation, user_input, content)
+            return content
+
+    async def stream_reply(self, session_id, user_input, on_text=None, **params):
+        """
+        Same as `reply`, calling `on_text` with each delta as it arrives; returns (reply, StreamMetrics).
+
+        The message and the reply are added to the conversation together, when
+        the stream ends. If the stream is cancelled or fails part-way, they are
+        added with whatever text arrived; if it fails before any text arrived,
+        the conversation is left as it was. Either way the history still
+        alternates user and assistant.
+        """
+        conversation = self.get_session(session_id)
+        async with self.locks[conversation]:
+            messages = conversation.messages + [{"role": "user", "content": user_input}]
+            params = {**self.defaults, **params}
+            started = time.perf_counter()
+            key, cached = await self.cached_reply(messages, params)
+            if cached is not None:
+                if on_text is not None:
+                    on_text(cached)
+                latency = time.perf_counter() - started
+                await self.commit_turn(conversation, user_input, cached)
+                return cached, build_metrics(self.model, self.count_tokens(cached), latency, latency, "cached")
+
+            pieces = []
+
+            def collect(text):
+                pieces.append(text)
+                if on_text is not None:
+                    on_text(text)
+
+            try:
+                async with self.semaphore:
+                    started = time.perf_counter()
+                    stream = await self.client.chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        stream=True,
+                        **params,
+                    )
+                    try:
+                        content, _, time_to_first_token, total_latency, finish_reason = await consume_async_stream(
+                            stream,
+                            lambda choice: (choice.delta.content, choice.finish_reason),
+                            on_text=collect,
+                            started=started,
+                        )
+                    finally:
+                        await stream.response.aclose()  # give the pooled connection back even when interrupted
+            except BaseException:
+                if pieces:
+                    await self.commit_turn(conversation, user_input, "".join(pieces))
+                raise
+            await self.commit_turn(conversation, user_input, content)
+            await self.remember_reply(key, content)
+            tokens = self.count_tokens(content)
+            return content, build_metrics(self.model, tokens, time_to_first_token, total_latency, finish_reason)
+
+    async def aclose(self):
+        await self.client.close()
+
+
+class BackgroundLoop:
+    """An event loop running in a daemon thread, so synchronous code can drive a ChatEngine"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def run(self, coroutine, timeout=None):
+        """Runs a coroutine on the background loop and waits for its result"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(timeout)
+
+    def iterate(self, start):
+        """
+        Yields the values a coroutine passes to its callback, from the calling thread.
+
+        `start(callback)` must return a coroutine that calls `callback(value)`
+        for every value it produces. Closing the generator early (e.g. when a
+        Streamlit rerun interrupts the script) cancels the coroutine.
+        """
+        values = queue.Queue()
+        done = object()
+        future = asyncio.run_coroutine_threadsafe(start(values.put), self.loop)
+        future.add_done_callback(lambda _: values.put(done))
+        try:
+            while (value := values.get()) is not done:
+                yield value
+            future.result()  # re-raise any error from the coroutine
+        finally:
+            future.cancel()
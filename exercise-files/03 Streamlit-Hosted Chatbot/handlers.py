@@ -1,15 +1,38 @@
-import openai
 from dotenv import load_dotenv
 from colorama import Fore
+import tiktoken
+from cache import ResponseCache
+from engine import BackgroundLoop, ChatEngine
+from sessions import BoundedConversation, SessionStore
 
 load_dotenv()
-client = openai.OpenAI()
 
 # Constants
 PERSONA = "You are a skilled stand-up comedian with a quick wit and charismatic presence, known for their clever storytelling and ability to connect with diverse audiences through humor that is both insightful and relatable."
 MODEL_ENGINE = "gpt-3.5-turbo"
 MESSAGE_SYSTEM = " You are a skilled stand-up comedian with a knack for telling 1-2 sentence funny stories."
-messages = [{"role": "system", "content": MESSAGE_SYSTEM}]
+MAX_SESSIONS = 1000  # least recently used sessions are evicted beyond this
+SESSION_IDLE_TTL = 30 * 60  # seconds of inactivity before a session is dropped
+MAX_TURNS = 20  # user/assistant pairs kept per session
+MAX_BYTES = 32_000  # message bytes kept per session
+# Replies are sampled at temperature 0.9, so identical prompts are only answered
+# from the cache when this is switched on (every repeat then gets the same joke)
+CACHE_CREATIVE_REPLIES = False
+
+# One engine and one pooled HTTP client shared by every browser session; each
+# session gets its own conversation, keyed by the id kept in st.session_state.
+sessions = SessionStore(max_sessions=MAX_SESSIONS, idle_ttl=SESSION_IDLE_TTL)
+engine = ChatEngine(
+    MODEL_ENGINE,
+    MESSAGE_SYSTEM,
+    conversation_factory=lambda system_prompt: BoundedConversation(system_prompt, MAX_TURNS, MAX_BYTES),
+    sessions=sessions,
+    cache=ResponseCache("responses.db", cache_nondeterministic=CACHE_CREATIVE_REPLIES),
+    count_tokens=lambda text: len(tiktoken.encoding_for_model(MODEL_ENGINE).encode(text)),
+    temperature=0.9,
+    max_tokens=150,
+)
+loop = BackgroundLoop()
 
 
 def to_dict(obj):
@@ -27,14 +50,21 @@ def print_messages(messages):
     return messages
 
 
-def generate_chat_completion(user_input=""):
-    messages.append({"role": "user", "content": user_input})
-    completion = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=messages,
-        temperature=0.9,
-        max_tokens=150,
-    )
-    message = completion.choices[0].message
-    messages.append(to_dict(message))
-    print(completion)
+def generate_chat_completion(user_input="", session_id="default"):
+    return loop.run(engine.reply(session_id, user_input))
+
+
+def stream_chat_completion(user_input="", session_id="default"):
+    """Yields the reply piece by piece as it is generated"""
+    yield from loop.iterate(lambda on_text: engine.stream_reply(session_id, user_input, on_text=on_text))
+
+
+def session_stats():
+    """Live sessions, bytes held and eviction counters across all browser sessions"""
+    return sessions.stats()
+
+
+def cache_stats():
+    """Hit/miss counters of the response cache"""
+    return engine.cache.stats()
+
@@ -1,6 +1,10 @@
 # https://streamlit.io/
+import uuid
 import streamlit as st
-from handlers import generate_chat_completion
+from handlers import cache_stats, session_stats, stream_chat_completion
+
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 
 # Streamlit App
 st.title("😂 Funny Chatbot App")  # Add a title
@@ -13,6 +17,18 @@ with st.form("user_form", clear_on_submit=True):
 # Press Enter to generate response from chatbot
 
 if submit_button:
-    with st.spinner("Wait for it...")
-    completion = generate_chat_completion(user_input)
-    st.write(completion)
+    # Render the reply as it streams in instead of waiting behind a spinner
+    placeholder = st.empty()
+    completion = ""
+    try:
+        for delta in stream_chat_completion(user_input, st.session_state.session_id):
+            completion += delta
+            placeholder.markdown(completion + "▌")
+        placeholder.markdown(completion)
+    except Exception as e:
+        placeholder.markdown(completion)
+        st.error(f"The reply was interrupted: {e}")
+
+with st.sidebar.expander("Server stats"):
+    st.json(session_stats())
+    st.json(cache_stats())
@@ -0,0 +1,99 @@
+from collections import OrderedDict
+import threading
+import time
+
+
+def message_size(message):
+    return len(message["role"]) + len(message["content"].encode("utf-8"))
+
+
+class BoundedConversation:
+    """Chat history capped at `max_turns` user/assistant pairs and `max_bytes`, system prompt pinned first"""
+
+    def __init__(self, system_prompt, max_turns=20, max_bytes=32_000):
+        self.max_turns = max_turns
+        self.max_bytes = max_bytes
+        self.messages = [{"role": "system", "content": system_prompt}]
+        self.bytes = message_size(self.messages[0])
+        self.dropped = 0
+
+    def append(self, message):
+        message = {"role": message["role"], "content": message["content"] or ""}
+        self.messages.append(message)
+        self.bytes += message_size(message)
+        # drop the oldest turns, but always keep the system prompt and the newest message
+        while len(self.messages) > 2 and (
+            len(self.messages) - 1 > 2 * self.max_turns or self.bytes > self.max_bytes
+        ):
+            self.bytes -= message_size(self.messages.pop(1))
+            self.dropped += 1
+
+
+class SessionStore:
+    """
+    Per-session state for every browser session connected to the server.
+
+    Sessions are kept in least-recently-used order: a session idle for longer
+    than `idle_ttl` seconds is expired, and the least recently used one is
+    evicted once there are more than `max_sessions`. All methods are safe to
+    call from Streamlit's script threads.
+    """
+
+    def __init__(self, max_sessions=1000, idle_ttl=30 * 60):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.sessions = OrderedDict()  # session_id -> (state, last access), oldest access first
+        self.lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get_or_create(self, session_id, factory):
+        """Returns the state of a session, creating it with `factory()` if it is new or was evicted"""
+        now = time.monotonic()
+        with self.lock:
+            self._expire(now)
+            if session_id in self.sessions:
+                state, _ = self.sessions.pop(session_id)
+            else:
+                state = factory()
+            self.sessions[session_id] = (state, now)
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+                self.evictions += 1
+            return state
+
+    def pop(self, session_id):
+        with self.lock:
+            entry = self.sessions.pop(session_id, None)
+            return entry[0] if entry else None
+
+    def __contains__(self, session_id):
+        with self.lock:
+            return session_id in self.sessions
+
+    def __getitem__(self, session_id):
+        with self.lock:
+            return self.sessions[session_id][0]
+
+    def _expire(self, now):
+        # sessions are ordered by last access, so only the stale prefix is visited
+        while self.sessions:
+            session_id, (_, last_access) = next(iter(self.sessions.items()))
+            if now - last_access <= self.idle_ttl:
+                break
+            del self.sessions[session_id]
+            self.expirations += 1
+
+    def stats(self):
+        """Counters for monitoring: live sessions, bytes held, evictions and expirations"""
+        with self.lock:
+            self._expire(time.monotonic())
+            states = [state for state, _ in self.sessions.values()]
+            return {
+                "live_sessions": len(states),
+                "bytes_held": sum(getattr(state, "bytes", 0) for state in states),
+                "messages_held": sum(len(getattr(state, "messages", ())) for state in states),
+                "messages_dropped": sum(getattr(state, "dropped", 0) for state in states),
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
@@ -0,0 +1,93 @@
+# https://platform.openai.com/docs/api-reference/streaming
+# Streaming helpers that print tokens as they arrive and time each request
+import time  # For latency measurements
+from dataclasses import asdict, dataclass  # For the structured metrics record
+
+
+@dataclass
+class StreamMetrics:
+    """Latency metrics for a single streamed request."""
+
+    model: str
+    time_to_first_token: float  # Seconds from sending the request to the first non-empty chunk
+    total_latency: float  # Seconds from sending the request to the end of the stream
+    completion_tokens: int
+    tokens_per_second: float  # Generation speed after the first token arrived
+    finish_reason: str = None
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def consume_stream(stream, get_text, on_text=None, started=None):
+    """
+    Reads a streamed response to the end, calling `on_text` with each piece of text as it arrives.
+
+    Args:
+        stream: The iterator returned by a `create(..., stream=True)` call.
+        get_text: Extracts (text, finish_reason) from one chunk.
+        on_text: Called with each non-empty piece of text, e.g. to print it.
+        started (float): `time.perf_counter()` value taken before the request was sent.
+
+    Returns:
+        tuple: (full text, number of text chunks, time to first token, total latency, finish reason)
+    """
+    started = time.perf_counter() if started is None else started
+    first_token_at = None
+    pieces = []
+    finish_reason = None
+
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        text, reason = get_text(chunk.choices[0])
+        finish_reason = reason or finish_reason
+        if text:
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            pieces.append(text)
+            if on_text is not None:
+                on_text(text)
+
+    finished = time.perf_counter()
+    first_token_at = finished if first_token_at is None else first_token_at
+    return "".join(pieces), len(pieces), first_token_at - started, finished - started, finish_reason
+
+
+async def consume_async_stream(stream, get_text, on_text=None, started=None):
+    """Same as `consume_stream` for the async iterator returned by `AsyncOpenAI`."""
+    started = time.perf_counter() if started is None else started
+    first_token_at = None
+    pieces = []
+    finish_reason = None
+
+    async for chunk in stream:
+        if not chunk.choices:
+            continue
+        text, reason = get_text(chunk.choices[0])
+        finish_reason = reason or finish_reason
+        if text:
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            pieces.append(text)
+            if on_text is not None:
+                on_text(text)
+
+    finished = time.perf_counter()
+    first_token_at = finished if first_token_at is None else first_token_at
+    return "".join(pieces), len(pieces), first_token_at - started, finished - started, finish_reason
+
+
+def build_metrics(model, completion_tokens, time_to_first_token, total_latency, finish_reason=None):
+    """Returns the metrics record for a finished stream."""
+    generation_time = total_latency - time_to_first_token
+    # With a single chunk there is no generation window to measure, so fall back to the whole request
+    tokens_per_second = completion_tokens / (generation_time if generation_time > 0 else total_latency or 1)
+    return StreamMetrics(
+        model=model,
+        time_to_first_token=round(time_to_first_token, 4),
+        total_latency=round(total_latency, 4),
+        completion_tokens=completion_tokens,
+        tokens_per_second=round(tokens_per_second, 2),
+        finish_reason=finish_reason,
+    )
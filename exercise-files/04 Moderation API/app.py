@@ -1,44 +1,100 @@
 # https://platform.openai.com/docs/guides/moderation/quickstart
+import uuid
 import streamlit as st
-from handlers import generate_chat_completion
+from handlers import stream_chat_completion
+from history import render_history
+from store import ConversationStore
+
+STORE_PATH = "conversations.db"
+HISTORY_PAGE = 20  # messages loaded on start and per "Load older messages" click
 
 st.title("🤖 Chatbot App")
 chat_placeholder = st.empty()
 
 
+@st.cache_resource
+def get_store():
+    """One store per server process, shared by every browser session"""
+    return ConversationStore(STORE_PATH)
+
+
 def init_chat_history():
     if "messages" not in st.session_state:
+        # the session id lives in the URL so a reload (or a server restart) resumes the same chat
+        session_id = st.experimental_get_query_params().get("session", [None])[0]
+        if session_id is None:
+            session_id = uuid.uuid4().hex
+            st.experimental_set_query_params(session=session_id)
+        st.session_state.session_id = session_id
+
+        # only the newest turns are loaded; older ones are paged in on demand
+        recent = get_store().tail(session_id, limit=HISTORY_PAGE)
+        st.session_state.oldest_seq = recent[0]["seq"] if recent else 0
         st.session_state["messages"] = []
         st.session_state.messages = [
             {"role": "system", "content": "You are a helpful assistant."}
-        ]
+        ] + [{"role": m["role"], "content": m["content"]} for m in recent]
+
+
+def load_older_messages():
+    older = get_store().before(st.session_state.session_id, st.session_state.oldest_seq, limit=HISTORY_PAGE)
+    if older:
+        st.session_state.oldest_seq = older[0]["seq"]
+        # keep the system prompt first
+        st.session_state.messages[1:1] = [{"role": m["role"], "content": m["content"]} for m in older]
+
+
+def save_message(role, content):
+    st.session_state.messages.append({"role": role, "content": content})
+    get_store().append(st.session_state.session_id, role, content)
+
+
+def render_stream(chunks):
+    """Renders a streamed reply as it arrives and commits it to the history exactly once"""
+    placeholder = st.empty()
+    response = ""
+    try:
+        # with output moderation nothing arrives until the first part of the reply is cleared
+        with st.spinner("Writing the reply..."):
+            chunk = next(chunks, None)
+        while chunk is not None:
+            response += chunk
+            placeholder.markdown(response + "▌")
+            chunk = next(chunks, None)
+        placeholder.markdown(response)
+    except Exception as e:
+        placeholder.markdown(response)
+        st.error(f"The reply was interrupted: {e}")
+    finally:
+        # also runs when a rerun stops the script mid-stream, so the partial reply is kept
+        chunks.close()
+        if response:
+            save_message("assistant", response)
 
 
 def start_chat():
-    # Display chat messages from history on app rerun
+    # Display the newest chat messages from history on app rerun
     with chat_placeholder.container():
-        for message in st.session_state.messages:
-            if message["role"] != "system":
-                with st.chat_message(message["role"]):
-                    st.markdown(message["content"])
+        render_history(
+            st.session_state.messages,
+            st.session_state,
+            page_size=HISTORY_PAGE,
+            load_older=load_older_messages,
+            has_older=st.session_state.oldest_seq > 0,
+        )
 
     # Accept user input
     if prompt := st.chat_input("What is up?"):
         # Add user message to chat history
-        st.session_state.messages.append({"role": "user", "content": prompt})
+        save_message("user", prompt)
 
         # Display user message in chat message container
         with st.chat_message("user"):
             st.markdown(prompt)
 
-        # Generate response from Chat models
-        response = generate_chat_completion(prompt, st.session_state.messages)
-
-        # message_placeholder.markdown(response)
+        # Stream the response from Chat models into the assistant message
         with st.chat_message("assistant"):
-            st.markdown(response)
-        # Add assistant's response to chat history
-        st.session_state.messages.append({"role": "assistant", "content": response})
+            render_stream(stream_chat_completion(prompt, st.session_state.messages))
 
 
 if __name__ == "__main__":
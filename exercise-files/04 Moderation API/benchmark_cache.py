@@ -0,0 +1,71 @@
+# Benchmark: chat completions through the response cache vs straight to a stubbed client
+import os
+import random
+import tempfile
+import time
+from types import SimpleNamespace
+from cache import ResponseCache
+
+MODEL_ENGINE = "gpt-3.5-turbo"
+SAMPLING = {"temperature": 0, "max_tokens": 60, "top_p": 1.0, "frequency_penalty": 0.0, "presence_penalty": 0.0}
+API_LATENCY = 0.05  # seconds per stubbed request
+REQUESTS = 400
+DISTINCT_PROMPTS = 60
+
+
+class StubClient:
+    """Stands in for openai.OpenAI: sleeps like a real request and echoes the prompt"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, **params):
+        self.calls += 1
+        time.sleep(self.latency)
+        message = SimpleNamespace(role="assistant", content=f"Answer to: {messages[-1]['content']}")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def workload(seed=0):
+    # a few prompts are asked far more often than the rest, like greetings and FAQs
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(DISTINCT_PROMPTS)]
+    prompts = rng.choices([f"question number {i}" for i in range(DISTINCT_PROMPTS)], weights, k=REQUESTS)
+    return [[{"role": "system", "content": "You are a helpful assistant."}, {"role": "user", "content": p}] for p in prompts]
+
+
+def run(label, call):
+    requests = workload()
+    started = time.perf_counter()
+    for messages in requests:
+        call(messages)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<22} {elapsed:7.2f}s  {elapsed / len(requests) * 1000:7.2f} ms/request")
+
+
+if __name__ == "__main__":
+    print(f"{REQUESTS} requests over {DISTINCT_PROMPTS} distinct prompts, {API_LATENCY * 1000:.0f} ms stubbed latency\n")
+
+    client = StubClient(API_LATENCY)
+    run("no cache", lambda messages: client.chat.completions.create(model=MODEL_ENGINE, messages=messages, **SAMPLING))
+    print(f"{'':<22} API calls: {client.calls}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "responses.db")
+
+        client = StubClient(API_LATENCY)
+        cache = ResponseCache(path)
+        run("cold cache", lambda messages: cache.create(client, MODEL_ENGINE, messages, **SAMPLING))
+        print(f"{'':<22} API calls: {client.calls}  {cache.stats()}")
+
+        # a new process: the memory tier is empty, the disk tier is warm
+        client = StubClient(API_LATENCY)
+        cache = ResponseCache(path)
+        run("warm disk cache", lambda messages: cache.create(client, MODEL_ENGINE, messages, **SAMPLING))
+        print(f"{'':<22} API calls: {client.calls}  {cache.stats()}")
+
+        client = StubClient(API_LATENCY)
+        run("temperature 1 (bypass)", lambda messages: cache.create(client, MODEL_ENGINE, messages, temperature=1))
+        print(f"{'':<22} API calls: {client.calls}  bypassed: {cache.stats()['bypassed']}")
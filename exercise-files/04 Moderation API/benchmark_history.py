@@ -0,0 +1,44 @@
+# Benchmark: time to redraw the chat history on a rerun, full history vs the windowed view
+# Runs Streamlit in bare mode (python3 benchmark_history.py): elements are built but not sent anywhere
+import statistics
+import time
+import streamlit as st
+from history import render_history
+
+TURNS = (10, 100, 1_000, 5_000)
+RERUNS = 20
+REPLY = "Here is a **longer** answer with a list:\n\n- first point\n- second point, about $5\n\n" * 4
+
+
+def conversation(turns):
+    messages = [{"role": "system", "content": "You are a helpful assistant."}]
+    for turn in range(turns):
+        messages.append({"role": "user", "content": f"Question {turn}: what about item {turn}?"})
+        messages.append({"role": "assistant", "content": f"Answer {turn}. {REPLY}"})
+    return messages
+
+
+def render_everything(messages):
+    # what start_chat() did before: every message is drawn on every rerun
+    for message in messages:
+        if message["role"] != "system":
+            with st.chat_message(message["role"]):
+                st.markdown(message["content"])
+
+
+def rerun_time(render, messages):
+    samples = []
+    for _ in range(RERUNS):
+        started = time.perf_counter()
+        render(messages)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+if __name__ == "__main__":
+    print(f"{'turns':>6} {'full history':>14} {'windowed':>10}")
+    for turns in TURNS:
+        messages = conversation(turns)
+        full = rerun_time(render_everything, messages)
+        windowed = rerun_time(lambda messages: render_history(messages, {}), messages)
+        print(f"{turns:>6} {full:>11.1f} ms {windowed:>7.2f} ms")
@@ -0,0 +1,76 @@
+# Timing check: sequential vs speculative moderation, against stub clients that inject delays
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("OPENAI_API_KEY", "stub")  # the stub client below replaces the real one
+import handlers
+from cache import ResponseCache
+
+MODERATION_LATENCY = 0.3
+COMPLETION_LATENCY = 0.8
+TOLERANCE = 0.1
+BLOCKED_WORD = "forbidden"
+
+
+class StubClient:
+    """Stands in for openai.OpenAI with fixed latencies; inputs containing BLOCKED_WORD are flagged"""
+
+    def __init__(self):
+        self.moderations = SimpleNamespace(create=self.moderate)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.complete))
+
+    def moderate(self, input):
+        time.sleep(MODERATION_LATENCY)
+        return SimpleNamespace(results=[SimpleNamespace(flagged=BLOCKED_WORD in input)])
+
+    def complete(self, model, messages, **params):
+        time.sleep(COMPLETION_LATENCY)
+        message = SimpleNamespace(role="assistant", content=f"Answer to: {messages[-1]['content']}")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def timed(user_input, **options):
+    messages = [{"role": "system", "content": "You are a helpful assistant."}, {"role": "user", "content": user_input}]
+    started = time.perf_counter()
+    response = handlers.generate_chat_completion(user_input, messages, **options)
+    return time.perf_counter() - started, response
+
+
+def check(label, elapsed, expected):
+    print(f"{label:<34} {elapsed:.2f}s  expected ~{expected:.2f}s")
+    assert abs(elapsed - expected) < TOLERANCE, f"{label}: {elapsed:.2f}s"
+
+
+if __name__ == "__main__":
+    handlers.client = StubClient()
+    with tempfile.TemporaryDirectory() as directory:
+        handlers.cache = ResponseCache(os.path.join(directory, "responses.db"))
+        print(f"moderation {MODERATION_LATENCY}s, completion {COMPLETION_LATENCY}s\n")
+
+        # every prompt is new so the cache never answers
+        results = {}
+        for speculative in (False, True):
+            for moderate_output in (False, True):
+                results[speculative, moderate_output] = timed(
+                    f"capital of France? {speculative} {moderate_output}",
+                    speculative=speculative,
+                    moderate_output=moderate_output,
+                )
+        flagged, flagged_response = timed(f"say something {BLOCKED_WORD}", speculative=True)
+        print()
+
+        check("sequential, input only", results[False, False][0], MODERATION_LATENCY + COMPLETION_LATENCY)
+        check("speculative, input only", results[True, False][0], max(MODERATION_LATENCY, COMPLETION_LATENCY))
+        check("sequential, input + output", results[False, True][0], 2 * MODERATION_LATENCY + COMPLETION_LATENCY)
+        check(
+            "speculative, input + output",
+            results[True, True][0],
+            max(MODERATION_LATENCY, COMPLETION_LATENCY) + MODERATION_LATENCY,
+        )
+        check("speculative, flagged input", flagged, MODERATION_LATENCY)
+
+        assert all(response.startswith("Answer to:") for _, response in results.values())
+        assert flagged_response == handlers.FLAGGED_INPUT
+        print("\nok")
@@ -0,0 +1,73 @@
+# Benchmark: throughput of the local moderation tier and the share of API calls it avoids
+import random
+import time
+from prefilter import BlocklistMatcher, TieredModerator, normalize
+
+INPUTS = 20_000
+DISTINCT_QUESTIONS = 2_000
+BLOCKLIST_SIZE = 1_000
+API_LATENCY = 0.15  # seconds a real moderation request would take, used for the estimate only
+
+
+def sample_corpus(seed=0):
+    """Chat turns like a live app sees: greetings, often-repeated questions, a long tail and a few blocked terms"""
+    rng = random.Random(seed)
+    words = [f"w{rng.randrange(10**6):06d}" for _ in range(5_000)]
+    blocklist = [f"blocked{i}" for i in range(BLOCKLIST_SIZE)]
+    questions = [" ".join(rng.choices(words, k=rng.randint(5, 40))) + "?" for _ in range(DISTINCT_QUESTIONS)]
+    weights = [1 / (rank + 1) for rank in range(DISTINCT_QUESTIONS)]
+    greetings = ["hi", "Hello!", "thanks", "Thank you.", "ok", "bye"]
+
+    corpus = []
+    for _ in range(INPUTS):
+        kind = rng.random()
+        if kind < 0.15:
+            corpus.append(rng.choice(greetings))
+        elif kind < 0.17:
+            corpus.append(f"{rng.choice(questions)} {rng.choice(blocklist)}")
+        elif kind < 0.37:
+            corpus.append(" ".join(rng.choices(words, k=rng.randint(5, 40))))  # never seen before
+        else:
+            text = rng.choices(questions, weights)[0]
+            corpus.append(text.upper() if rng.random() < 0.1 else text)  # repeats, sometimes re-cased
+    return corpus, blocklist
+
+
+def naive_find(patterns, text):
+    return [pattern for pattern in patterns if pattern in text]
+
+
+if __name__ == "__main__":
+    corpus, blocklist = sample_corpus()
+    print(f"{INPUTS} inputs, {BLOCKLIST_SIZE} blocklist patterns\n")
+
+    normalized = [normalize(text) for text in corpus]
+    matcher = BlocklistMatcher(blocklist)
+    for label, find in (
+        ("substring scan", lambda text: naive_find(blocklist, text)),
+        ("Aho-Corasick", matcher.find),
+    ):
+        started = time.perf_counter()
+        hits = sum(1 for text in normalized if find(text))
+        elapsed = time.perf_counter() - started
+        print(f"{label:<16} {INPUTS / elapsed:>10,.0f} inputs/s   {hits} blocked")
+
+    remote_calls = 0
+
+    def remote(text):
+        global remote_calls
+        remote_calls += 1
+        return False
+
+    moderator = TieredModerator(remote, blocklist=blocklist)
+    started = time.perf_counter()
+    for text in corpus:
+        moderator.moderate(text)
+    elapsed = time.perf_counter() - started
+    stats = moderator.stats()
+    local = INPUTS - remote_calls
+
+    print(f"\ntiered moderator {INPUTS / elapsed:>10,.0f} inputs/s (remote stubbed out)")
+    print(f"answered locally: {local} ({stats['remote_avoided']:.1%})  remote calls: {remote_calls}")
+    print(f"by tier: blocklist {stats['blocklist']}, cache {stats['cache']}, policy {stats['policy']}, remote {stats['remote']}")
+    print(f"API time avoided at {API_LATENCY * 1000:.0f} ms/request: {local * API_LATENCY:.0f}s")
@@ -1,7 +1,12 @@
 # https://platform.openai.com/docs/guides/moderation/quickstart
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import re
 import openai
 from dotenv import load_dotenv
 import os
+from cache import ResponseCache
+from prefilter import TieredModerator, load_blocklist
 
 
 load_dotenv()
@@ -11,25 +16,178 @@ client = openai.OpenAI()
 MODEL_ENGINE = "gpt-3.5-turbo"
 MESSAGE_SYSTEM = "You are a helpful assistant"
 messages = [{"role": "system", "content": MESSAGE_SYSTEM}]
+SAMPLING = {
+    "temperature": 0,
+    "max_tokens": 60,
+    "top_p": 1.0,
+    "frequency_penalty": 0.0,
+    "presence_penalty": 0.0,
+}
 
+FLAGGED_INPUT = ":red [Your comment has been flagged as inappropriate.]"
+FLAGGED_OUTPUT = ":red [The reply has been withheld by moderation.]"
+WITHHELD = "\n\n" + FLAGGED_OUTPUT  # follows the part of a streamed reply shown before a flagged window
+# Start the completion while the input is being moderated instead of after it
+SPECULATIVE_MODERATION = True
+# Moderate the generated reply too; nothing of it is shown until it has been cleared.
+# A streamed reply is checked a few sentences at a time, so it arrives in steps of
+# about OUTPUT_WINDOW_CHARS instead of token by token, each step one moderation call later
+MODERATE_OUTPUT = True
+OUTPUT_WINDOW_CHARS = 200
+SENTENCE_END = re.compile(r"[.!?:;]\s|\n")
 
-def moderate(user_input):
+# Identical conversations get the stored reply instead of a new request
+cache = ResponseCache("responses.db")
+executor = ThreadPoolExecutor(max_workers=16)
+
+# Patterns that are flagged locally without asking the API, one per line
+BLOCKLIST_PATH = "blocklist.txt"
+
+
+def remote_moderate(user_input):
     response = client.moderations.create(input=user_input)
     return response.results[0].flagged
 
 
-def generate_chat_completion(user_input, messages):
+# Blocklist hits, repeats and trivial inputs are answered locally; the rest go to the API
+moderator = TieredModerator(
+    remote_moderate,
+    blocklist=load_blocklist(BLOCKLIST_PATH) if os.path.exists(BLOCKLIST_PATH) else (),
+)
+
+
+def moderate(user_input):
+    return moderator.moderate(user_input).flagged
+
+
+def generate_chat_completion(user_input, messages, speculative=SPECULATIVE_MODERATION, moderate_output=MODERATE_OUTPUT):
+    if speculative:
+        return generate_speculative_completion(user_input, messages, moderate_output)
     flagged = moderate(user_input)
     print(f"Flagged: {flagged}")
     if flagged: 
-        return ":red [Your comment has been flagged as inappropriate.]"
-    completion = client.chat.completions.create(
-        model=MODEL_ENGINE,
-        messages=messages,
-        temperature=0,
-        max_tokens=60,
-        top_p=1.0,
-        frequency_penalty=0.0,
-        presence_penalty=0.0,
-    )
-    return completion.choices[0].message.content
+        return FLAGGED_INPUT
+    return checked_reply(*complete(messages, moderate_output), moderate_output)
+
+
+def complete(messages, moderate_output=MODERATE_OUTPUT):
+    """
+    Returns (cache key, reply, cached) without storing a new reply, so a flagged exchange is never cached.
+
+    With `moderate_output`, only a cached reply that has been cleared by
+    moderation counts as a hit.
+    """
+    key, content = cache.lookup(MODEL_ENGINE, messages, moderated=moderate_output, **SAMPLING)
+    if content is not None:
+        return key, content, True
+    completion = client.chat.completions.create(model=MODEL_ENGINE, messages=messages, **SAMPLING)
+    return key, completion.choices[0].message.content, False
+
+
+def checked_reply(key, content, cached, moderate_output):
+    """Moderates a newly generated reply if asked to and caches it, with its verdict, once it is cleared"""
+    if cached:
+        return content
+    if moderate_output and moderate(content):
+        print("Flagged output")
+        return FLAGGED_OUTPUT
+    if key is not None:
+        cache.put(key, content, moderated=moderate_output)
+    return content
+
+
+def generate_speculative_completion(user_input, messages, moderate_output=MODERATE_OUTPUT):
+    """
+    Moderates the input and generates the reply at the same time, then moderates the reply.
+
+    The turn takes roughly max(moderation, completion) (plus the output
+    moderation) instead of their sum. If the input is flagged, the
+    completion is cancelled if it has not started yet; otherwise its result
+    is discarded (its tokens are still billed).
+    """
+    moderation = executor.submit(moderate, user_input)
+    completion = executor.submit(complete, list(messages), moderate_output)
+    flagged = moderation.result()
+    print(f"Flagged: {flagged}")
+    if flagged:
+        completion.cancel()
+        return FLAGGED_INPUT
+    return checked_reply(*completion.result(), moderate_output)
+
+
+def stream_chat_completion(user_input, messages, speculative=SPECULATIVE_MODERATION, moderate_output=MODERATE_OUTPUT):
+    """
+    Yields the reply piece by piece as it is generated.
+
+    In speculative mode the stream is opened while the input is moderated;
+    deltas are held back until moderation clears the input, and the stream is
+    closed if it is flagged. Otherwise a flagged input never opens a stream.
+
+    With `moderate_output`, the reply is cut at the last sentence end each
+    time OUTPUT_WINDOW_CHARS have come in, and each window is moderated while
+    the stream goes on and yielded once it is cleared. If one is flagged, the
+    stream is closed and FLAGGED_OUTPUT follows the text already shown. A
+    cached reply has already been cleared and is yielded as it is.
+    """
+    moderation = executor.submit(moderate, user_input)
+    if not speculative and moderation.result():
+        print("Flagged: True")
+        yield FLAGGED_INPUT
+        return
+    key, cached = cache.lookup(MODEL_ENGINE, messages, moderated=moderate_output, **SAMPLING)
+    stream = None
+    if cached is None:
+        stream = client.chat.completions.create(model=MODEL_ENGINE, messages=messages, stream=True, **SAMPLING)
+
+    pieces = []
+    windows = deque()  # (text, moderation future) in reply order
+    buffer = ""
+    try:
+        flagged = moderation.result()
+        print(f"Flagged: {flagged}")
+        if flagged:
+            yield FLAGGED_INPUT
+            return
+        if cached is not None:
+            yield cached
+            return
+        for chunk in stream:
+            if not (chunk.choices and chunk.choices[0].delta.content):
+                continue
+            text = chunk.choices[0].delta.content
+            pieces.append(text)
+            if not moderate_output:
+                yield text
+                continue
+            buffer += text
+            ends = [match.end() for match in SENTENCE_END.finditer(buffer)]
+            if len(buffer) >= OUTPUT_WINDOW_CHARS and ends:
+                windows.append((buffer[: ends[-1]], executor.submit(moderate, buffer[: ends[-1]])))
+                buffer = buffer[ends[-1] :]
+            # yield the windows already cleared, in order, without waiting on the others
+            while windows and windows[0][1].done():
+                window, verdict = windows.popleft()
+                if verdict.result():
+                    print("Flagged output")
+                    yield WITHHELD
+                    return
+                yield window
+        if buffer:
+            windows.append((buffer, executor.submit(moderate, buffer)))
+        while windows:
+            window, verdict = windows.popleft()
+            if verdict.result():
+                print("Flagged output")
+                yield WITHHELD
+                return
+            yield window
+    finally:
+        # closing the generator early (e.g. a Streamlit rerun) or a flagged input or output releases the connection
+        if stream is not None:
+            stream.response.close()
+        for _, verdict in windows:
+            verdict.cancel()
+
+    # only a reply that streamed to the end and passed moderation is cached
+    if key is not None:
+        cache.put(key, "".join(pieces), moderated=moderate_output)
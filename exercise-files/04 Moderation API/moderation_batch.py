@@ -0,0 +1,342 @@
+# Offline bulk moderation of stored chat turns
+# Usage: python moderation_batch.py conversations.db scores.jsonl --concurrency 4
+# Interrupt at any time; running the same command again resumes from the checkpoint.
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import openai
+from dotenv import load_dotenv
+
+MODERATION_MODEL = "text-moderation-latest"
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+MAX_CHUNK_CHARS = 8000  # ~2k tokens, well under the per-input limit
+CHUNK_OVERLAP = 200  # so a phrase cut at a chunk boundary is still seen whole once
+SETTLE_SECONDS = 5  # store messages newer than this are left for the next run, so a write still in flight is not passed over
+
+
+def read_records(path, after=None):
+    """
+    Yields (key, id, text) from a conversations.db store, a JSONL file ({"id", "text"} or {"id", "content"}
+    per line) or a plain text file (one text per line), in key order, starting after the key `after`.
+
+    The key is [created, session_id, seq] for the store and the line number
+    for files. The store keeps growing while it is read, in any session, so
+    its messages are read in the order they were written and a run is resumed
+    from the last key done: a turn added to an earlier session since then
+    sorts after it and is picked up. Messages written in the last
+    SETTLE_SECONDS are left for the next run. This assumes the writers'
+    clocks do not go back.
+    """
+    if path.endswith(".db"):
+        conn = sqlite3.connect(path)
+        try:
+            until = time.time() - SETTLE_SECONDS
+            if after is None:
+                rows = conn.execute(
+                    "SELECT created, session_id, seq, content FROM messages WHERE created <= ? ORDER BY created, session_id, seq",
+                    (until,),
+                )
+            else:
+                rows = conn.execute(
+                    "SELECT created, session_id, seq, content FROM messages WHERE created <= ? AND (created, session_id, seq) > (?, ?, ?) "
+                    "ORDER BY created, session_id, seq",
+                    (until, *after),
+                )
+            for created, session_id, seq, content in rows:
+                yield [created, session_id, seq], f"{session_id}:{seq}", content
+        finally:
+            conn.close()
+        return
+    with open(path, encoding="utf-8") as file:
+        for line_number, line in enumerate(file, start=1):
+            line = line.strip()
+            if not line or (after is not None and line_number <= after):
+                continue
+            if path.endswith(".jsonl"):
+                record = json.loads(line)
+                yield line_number, record.get("id", line_number), record.get("text", record.get("content", ""))
+            else:
+                yield line_number, line_number, line
+
+
+def chunk_text(text, max_chars=MAX_CHUNK_CHARS, overlap=CHUNK_OVERLAP):
+    """Splits a long text into overlapping pieces, preferring to cut at whitespace"""
+    if len(text) <= max_chars:
+        return [text]
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + max_chars, len(text))
+        if end < len(text):
+            space = text.rfind(" ", start + max_chars // 2, end)
+            if space != -1:
+                end = space
+        chunks.append(text[start:end])
+        if end == len(text):
+            break
+        start = end - overlap
+    return chunks
+
+
+def batches(records, batch_size):
+    """
+    Groups records so each group has about `batch_size` chunks (a record's chunks are never split).
+
+    Yields (key of the group's last record, [(id, chunks), ...]).
+    """
+    batch, size, last_key = [], 0, None
+    for key, record_id, text in records:
+        chunks = chunk_text(text or "")
+        if batch and size + len(chunks) > batch_size:
+            yield last_key, batch
+            batch, size = [], 0
+        batch.append((record_id, chunks))
+        size += len(chunks)
+        last_key = key
+    if batch:
+        yield last_key, batch
+
+
+def as_dict(model):
+    # API names such as "self-harm" and "sexual/minors" rather than the Python attribute names
+    return model.model_dump(by_alias=True) if hasattr(model, "model_dump") else model.dict(by_alias=True)
+
+
+class RateLimiter:
+    """
+    Spaces requests out to at most `rpm` per minute across all threads.
+
+    When one request is rate limited, `pause()` holds back every thread, not
+    just the one that got the 429, so the pool backs off as a whole.
+    """
+
+    def __init__(self, rpm=None):
+        self.interval = 60 / rpm if rpm else 0.0
+        self.next_allowed = 0.0
+        self.lock = threading.Lock()
+        self.pauses = 0
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_allowed)
+            self.next_allowed = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+    def pause(self, seconds):
+        with self.lock:
+            self.next_allowed = max(self.next_allowed, time.monotonic() + seconds)
+            self.pauses += 1
+
+
+def retry_after(error, attempt, base=0.5, cap=30.0):
+    """Seconds to wait before retrying: the server's Retry-After if it sent one, else full-jitter backoff"""
+    response = getattr(error, "response", None)
+    header = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(header)
+    except (TypeError, ValueError):
+        return random.uniform(0, min(cap, base * 2**attempt))
+
+
+def moderate_inputs(client, inputs, limiter, max_retries=5):
+    """Sends a list of strings in one moderation request, retrying on 429/5xx; returns (results, attempts)"""
+    attempt = 0
+    while True:
+        limiter.wait()
+        try:
+            return client.moderations.create(input=inputs, model=MODERATION_MODEL).results, attempt + 1
+        except openai.APIStatusError as e:
+            if e.status_code not in RETRY_STATUS_CODES or attempt >= max_retries:
+                raise
+            delay = retry_after(e, attempt)
+            if e.status_code == 429:
+                limiter.pause(delay)
+            else:
+                time.sleep(delay)
+        except openai.APIConnectionError as e:
+            if attempt >= max_retries:
+                raise
+            time.sleep(retry_after(e, attempt))
+        attempt += 1
+
+
+def moderate_batch(client, batch, limiter, batch_size, max_retries=5):
+    """
+    Moderates a batch of (id, chunks) and returns one output record per id.
+
+    A record split into several chunks is flagged if any chunk is, and each
+    category score is the highest over its chunks.
+    """
+    inputs = [chunk for _, chunks in batch for chunk in chunks]
+    results, requests, attempts = [], 0, 0
+    for start in range(0, len(inputs), batch_size):
+        part, part_attempts = moderate_inputs(client, inputs[start : start + batch_size], limiter, max_retries)
+        results.extend(part)
+        requests += 1
+        attempts += part_attempts
+
+    records = []
+    position = 0
+    for record_id, chunks in batch:
+        chunk_results = results[position : position + len(chunks)]
+        position += len(chunks)
+        scores = {}
+        categories = set()
+        for result in chunk_results:
+            for name, score in as_dict(result.category_scores).items():
+                scores[name] = max(scores.get(name, 0.0), score)
+            categories.update(name for name, hit in as_dict(result.categories).items() if hit)
+        records.append(
+            {
+                "id": record_id,
+                "flagged": any(result.flagged for result in chunk_results),
+                "categories": sorted(categories),
+                "scores": scores,
+                "chunks": len(chunks),
+            }
+        )
+    return records, requests, attempts - requests
+
+
+def load_checkpoint(path, input_path, output_path):
+    if not os.path.exists(path):
+        return {"input": input_path, "output": output_path, "last_key": None, "records": 0, "output_bytes": 0, "flagged": 0}
+    with open(path, encoding="utf-8") as file:
+        checkpoint = json.load(file)
+    if checkpoint["input"] != input_path or checkpoint["output"] != output_path:
+        raise SystemExit(f"{path} belongs to {checkpoint['input']} -> {checkpoint['output']}; pass --restart to start over")
+    return checkpoint
+
+
+def save_checkpoint(path, checkpoint):
+    # write-then-rename, so an interrupted run never leaves a half-written checkpoint
+    temporary = path + ".tmp"
+    with open(temporary, "w", encoding="utf-8") as file:
+        json.dump(checkpoint, file)
+    os.replace(temporary, path)
+
+
+def run_pipeline(
+    client,
+    input_path,
+    output_path,
+    checkpoint_path=None,
+    batch_size=32,
+    concurrency=4,
+    rpm=None,
+    max_retries=5,
+    restart=False,
+):
+    """
+    Moderates every record of `input_path` and appends the results to `output_path` as JSONL.
+
+    Batches run concurrently, but results are written in key order, so the
+    checkpoint is just the key of the last record written and the output size
+    at that point (the record count is kept for reporting). A resumed run
+    truncates anything written after the last checkpoint and reads on from
+    the next key.
+
+    Returns:
+        dict: A summary with counts and throughput.
+    """
+    checkpoint_path = checkpoint_path or output_path + ".checkpoint"
+    if restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    checkpoint = load_checkpoint(checkpoint_path, input_path, output_path)
+    resumed_from = checkpoint["records"]
+
+    limiter = RateLimiter(rpm)
+    records = read_records(input_path, after=checkpoint["last_key"])
+    done = requests = retries = 0
+    started = time.perf_counter()
+
+    mode = "r+b" if checkpoint["last_key"] is not None and os.path.exists(output_path) else "wb"
+    with open(output_path, mode) as output, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        output.truncate(checkpoint["output_bytes"] if mode == "r+b" else 0)
+        output.seek(0, os.SEEK_END)
+
+        pending = deque()  # (last key, future) in submission (= key) order
+
+        def write_oldest():
+            nonlocal done, requests, retries
+            last_key, future = pending.popleft()
+            results, batch_requests, batch_retries = future.result()
+            for record in results:
+                output.write((json.dumps(record) + "\n").encode("utf-8"))
+            output.flush()
+            os.fsync(output.fileno())
+            done += len(results)
+            requests += batch_requests
+            retries += batch_retries
+            checkpoint["last_key"] = last_key
+            checkpoint["records"] += len(results)
+            checkpoint["flagged"] += sum(record["flagged"] for record in results)
+            checkpoint["output_bytes"] = output.tell()
+            save_checkpoint(checkpoint_path, checkpoint)
+            elapsed = time.perf_counter() - started
+            print(f"\r[{checkpoint['records']}] {done / elapsed:.1f} records/s", end="", flush=True)
+
+        # at most 2 batches per worker are queued, so memory stays flat however long the input is
+        for last_key, batch in batches(records, batch_size):
+            if len(pending) >= 2 * concurrency:
+                write_oldest()
+            pending.append((last_key, pool.submit(moderate_batch, client, batch, limiter, batch_size, max_retries)))
+        while pending:
+            write_oldest()
+
+    elapsed = time.perf_counter() - started
+    print()
+    return {
+        "records": checkpoint["records"],
+        "resumed_from": resumed_from,
+        "moderated_now": done,
+        "flagged": checkpoint["flagged"],
+        "requests": requests,
+        "retries": retries,
+        "rate_limit_pauses": limiter.pauses,
+        "elapsed": round(elapsed, 3),
+        "records_per_second": round(done / elapsed, 2) if elapsed else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Moderate stored chat turns in bulk and save the category scores")
+    parser.add_argument("input", help="conversations.db, JSONL ({'id', 'text'}) or text file with one input per line")
+    parser.add_argument("output", help="JSONL file the scores are written to")
+    parser.add_argument("--checkpoint", default=None, help="Checkpoint file (default: <output>.checkpoint)")
+    parser.add_argument("--batch-size", type=int, default=32, help="Inputs per moderation request")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum requests in flight")
+    parser.add_argument("--rpm", type=int, default=None, help="Requests per minute to stay under")
+    parser.add_argument("--max-retries", type=int, default=5, help="Retries per request on 429/5xx")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start from the beginning")
+    parser.add_argument("--base-url", default=None, help="API base URL, e.g. a local stand-in server")
+    args = parser.parse_args()
+
+    load_dotenv()
+    # Retries are handled by `moderate_inputs()` so the client must not retry on its own
+    client = openai.OpenAI(base_url=args.base_url, max_retries=0)
+
+    summary = run_pipeline(
+        client,
+        args.input,
+        args.output,
+        checkpoint_path=args.checkpoint,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        rpm=args.rpm,
+        max_retries=args.max_retries,
+        restart=args.restart,
+    )
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+# Local moderation tier in front of the Moderation API
+# https://en.wikipedia.org/wiki/Aho%E2%80%93Corasick_algorithm
+from collections import OrderedDict, deque, namedtuple
+import hashlib
+import string
+import threading
+import unicodedata
+
+Verdict = namedtuple("Verdict", "flagged source matched")  # source: blocklist, cache, policy or remote
+
+# Inputs the default policy lets through without asking the API
+SAFE_PHRASES = {
+    "hi", "hello", "hey", "thanks", "thank you", "ok", "okay", "yes", "no", "bye", "goodbye",
+    "good morning", "good evening", "how are you", "sure", "cool", "great",
+}
+
+
+def normalize(text):
+    """Canonical form used for matching and cache keys: NFKC, case-folded, whitespace collapsed"""
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+def text_key(normalized):
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).digest()
+
+
+def load_blocklist(path):
+    """One pattern per line; blank lines and lines starting with # are ignored"""
+    with open(path, encoding="utf-8") as file:
+        return [line.strip() for line in file if line.strip() and not line.startswith("#")]
+
+
+class BlocklistMatcher:
+    """
+    Finds any of a set of patterns in a text in a single pass (Aho-Corasick).
+
+    The patterns are compiled into a trie with failure links once, so a
+    lookup costs one step per character of the text however many patterns
+    there are. With `whole_words`, a match must not be part of a longer word
+    ("ass" does not match "class").
+    """
+
+    def __init__(self, patterns, whole_words=True):
+        self.whole_words = whole_words
+        self.goto = [{}]  # state -> {character: next state}
+        self.fail = [0]
+        self.output = [()]  # state -> patterns that end at this state
+        patterns = {normalize(p) for p in patterns if normalize(p)}
+        self.patterns = len(patterns)
+        for pattern in patterns:
+            state = 0
+            for character in pattern:
+                if character not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(())
+                    self.goto[state][character] = len(self.goto) - 1
+                state = self.goto[state][character]
+            self.output[state] += (pattern,)
+        self._link()
+
+    def _link(self):
+        # breadth first, so the failure state of every shorter prefix is known first
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for character, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and character not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(character, 0)
+                self.output[child] += self.output[self.fail[child]]
+
+    def __len__(self):
+        return self.patterns
+
+    def find(self, normalized, first=False):
+        """Returns the patterns found in an already normalized text (only the first one with `first`)"""
+        goto, fail, output = self.goto, self.fail, self.output
+        found = []
+        state = 0
+        for end, character in enumerate(normalized, start=1):
+            while state and character not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(character, 0)
+            for pattern in output[state]:
+                if self.whole_words and not self._bounded(normalized, end - len(pattern), end):
+                    continue
+                found.append(pattern)
+                if first:
+                    return found
+        return found
+
+    @staticmethod
+    def _bounded(text, start, end):
+        return (start == 0 or not text[start - 1].isalnum()) and (end == len(text) or not text[end].isalnum())
+
+
+class VerdictCache:
+    """Bounded LRU of recent verdicts keyed by a hash of the normalized text; safe to share between threads"""
+
+    def __init__(self, max_items=10_000):
+        self.max_items = max_items
+        self.verdicts = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            verdict = self.verdicts.get(key)
+            if verdict is not None:
+                self.verdicts.move_to_end(key)
+            return verdict
+
+    def put(self, key, verdict):
+        with self.lock:
+            self.verdicts[key] = verdict
+            self.verdicts.move_to_end(key)
+            while len(self.verdicts) > self.max_items:
+                self.verdicts.popitem(last=False)
+
+    def __len__(self):
+        return len(self.verdicts)
+
+
+def trivial_input(normalized):
+    """Default policy: skip the API for empty input, punctuation or a handful of stock greetings"""
+    stripped = normalized.strip(string.punctuation + " ")
+    return not stripped or stripped.isdigit() or stripped in SAFE_PHRASES
+
+
+class TieredModerator:
+    """
+    Answers moderation locally when it can and calls `remote(text) -> bool` only when it must.
+
+    The tiers run cheapest first: the blocklist flags obvious violations, the
+    `skip_remote(normalized) -> bool` policy hook passes inputs that are safe
+    without a remote check, and the verdict cache answers repeats of the rest.
+    Everything else goes to `remote`, and its verdict is cached.
+    """
+
+    def __init__(self, remote, blocklist=(), cache_items=10_000, skip_remote=trivial_input, whole_words=True):
+        self.remote = remote
+        self.matcher = BlocklistMatcher(blocklist, whole_words=whole_words)
+        self.cache = VerdictCache(cache_items)
+        self.skip_remote = skip_remote
+        self.counts = {"blocklist": 0, "cache": 0, "policy": 0, "remote": 0}
+        self.lock = threading.Lock()
+
+    def moderate(self, text):
+        normalized = normalize(text)
+        verdict = self._local(normalized)
+        if verdict is None:
+            key = text_key(normalized)
+            verdict = self.cache.get(key)
+            if verdict is not None:
+                verdict = verdict._replace(source="cache")
+            else:
+                verdict = Verdict(bool(self.remote(text)), "remote", None)
+                self.cache.put(key, verdict)
+        with self.lock:
+            self.counts[verdict.source] += 1
+        return verdict
+
+    def _local(self, normalized):
+        matched = self.matcher.find(normalized, first=True)
+        if matched:
+            return Verdict(True, "blocklist", matched[0])
+        if self.skip_remote is not None and self.skip_remote(normalized):
+            return Verdict(False, "policy", None)
+        return None
+
+    def stats(self):
+        with self.lock:
+            total = sum(self.counts.values())
+            return {
+                **self.counts,
+                "remote_avoided": round(1 - self.counts["remote"] / total, 3) if total else 0.0,
+                "cached_verdicts": len(self.cache),
+                "blocklist_patterns": len(self.matcher),
+            }
@@ -0,0 +1,115 @@
+# Benchmark: end-to-end latency and peak memory per generated image
+# old: url + unpooled requests.get buffering r.content; new: url + pooled streamed download; new: b64_json
+# A local stand-in serves both the Images API and the image files (plain HTTP, so no TLS handshakes are saved here)
+import base64
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import openai
+import requests
+from PIL import Image
+
+# handlers opens its image store in the working directory, so run in a scratch one
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+scratch = tempfile.TemporaryDirectory()
+os.chdir(scratch.name)
+os.makedirs("media")
+os.environ.setdefault("OPENAI_API_KEY", "stub")
+
+import handlers
+
+IMAGES = 10
+API_LATENCY = 0.05  # seconds the stand-in takes to "generate"
+DOWNLOAD_LATENCY = 0.08  # seconds before the first byte of an image download
+
+
+def make_png(seed):
+    rng = random.Random(seed)
+    base = Image.linear_gradient("L").resize((1024, 1024)).convert("RGB")
+    noise = Image.effect_noise((1024, 1024), rng.randint(20, 60)).convert("RGB")
+    buffer = io.BytesIO()
+    Image.blend(base, noise, 0.3).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+class ImagesHandler(BaseHTTPRequestHandler):
+    """POST /v1/images/generations answers with a url or b64_json; GET /files/<n>.png serves the image"""
+
+    protocol_version = "HTTP/1.1"  # keep-alive, so a pooled session can reuse the connection
+    images = {}
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(API_LATENCY)
+        name = f"{random.randrange(IMAGES)}.png"
+        if body.get("response_format") == "b64_json":
+            datum = {"b64_json": base64.b64encode(self.images[name]).decode("ascii")}
+        else:
+            datum = {"url": f"http://127.0.0.1:{self.server.server_port}/files/{name}"}
+        payload = json.dumps({"created": int(time.time()), "data": [datum]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        time.sleep(DOWNLOAD_LATENCY)
+        data = self.images[os.path.basename(self.path)]
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        for start in range(0, len(data), 64 * 1024):
+            self.wfile.write(data[start : start + 64 * 1024])
+
+    def log_message(self, *args):
+        pass
+
+
+def old_pipeline(prompt):
+    # generate_image() + downloadFile() as they were: url, then a fresh connection and the whole body in memory
+    url = handlers.generate_image(prompt, response_format="url").url
+    r = requests.get(url, allow_redirects=True)
+    r.raise_for_status()
+    with open(os.path.join("media", "image_" + prompt.replace(" ", "_") + ".png"), "wb") as f:
+        f.write(r.content)
+
+
+def new_pipeline(prompt, response_format):
+    handlers.save_image(prompt, handlers.generate_image(prompt, response_format=response_format))
+
+
+def measure(label, call):
+    latencies = []
+    tracemalloc.start()
+    for i in range(IMAGES):
+        started = time.perf_counter()
+        call(f"benchmark image {i}")
+        latencies.append(time.perf_counter() - started)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{label:<28} {sum(latencies) / len(latencies) * 1000:7.0f} ms/image   peak {peak / 2**20:5.1f} MiB")
+
+
+if __name__ == "__main__":
+    with scratch:
+        ImagesHandler.images = {f"{i}.png": make_png(i) for i in range(IMAGES)}
+        server = ThreadingHTTPServer(("127.0.0.1", 0), ImagesHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        handlers.client = openai.OpenAI(base_url=f"http://127.0.0.1:{server.server_port}/v1")
+
+        size = sum(map(len, ImagesHandler.images.values())) / IMAGES
+        print(f"{IMAGES} images of {size / 2**20:.1f} MiB, {API_LATENCY * 1000:.0f} ms API, "
+              f"{DOWNLOAD_LATENCY * 1000:.0f} ms download latency\n")
+        measure("url, buffered (old)", old_pipeline)
+        measure("url, pooled + streamed", lambda prompt: new_pipeline(prompt, "url"))
+        measure("b64_json, decoded to disk", lambda prompt: new_pipeline(prompt, "b64_json"))
+        server.shutdown()
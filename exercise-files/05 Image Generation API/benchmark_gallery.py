@@ -0,0 +1,74 @@
+# Benchmark: gallery rerun cost, resizing every full-size image vs paged thumbnails from the cache
+import os
+import random
+import sys
+import tempfile
+import time
+from PIL import Image
+
+# handlers opens its image store in the working directory, so run in a scratch one
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+scratch = tempfile.TemporaryDirectory()
+os.chdir(scratch.name)
+os.makedirs("media")
+os.environ.setdefault("OPENAI_API_KEY", "stub")  # no request is made
+
+import handlers
+from main import PAGE_SIZE
+from thumbnails import ThumbnailCache
+
+IMAGES = 120
+IMAGE_SIZE = (1024, 1024)
+SUBJECTS = ["white siamese cat", "red fox", "field of flowers", "city at night"]
+
+
+def make_images(directory, count, seed=0):
+    rng = random.Random(seed)
+    for i in range(count):
+        # a noisy gradient, so the PNGs are about as large as generated images
+        base = Image.linear_gradient("L").resize(IMAGE_SIZE).convert("RGB")
+        noise = Image.effect_noise(IMAGE_SIZE, rng.randint(20, 60)).convert("RGB")
+        Image.blend(base, noise, 0.3).save(os.path.join(directory, f"image_{SUBJECTS[i % len(SUBJECTS)].replace(' ', '_')}_{i}.png"))
+
+
+def old_gallery(folder):
+    # what get_files() and display_gallery() did on every rerun
+    for name in os.listdir(folder):
+        if name.endswith((".jpg", ".png")):
+            Image.open(os.path.join(folder, name)).resize((600, 400))
+
+
+def paged_gallery(cache, page=1, query=None):
+    cursor = None
+    for _ in range(page - 1):
+        _, cursor = handlers.get_files(PAGE_SIZE, cursor, query)
+    images, _ = handlers.get_files(PAGE_SIZE, cursor, query)
+    return cache.get_many([image["path"] for image in images])
+
+
+def timed(label, call):
+    started = time.perf_counter()
+    call()
+    print(f"{label:<36} {time.perf_counter() - started:7.3f}s")
+
+
+if __name__ == "__main__":
+    with scratch:
+        # loose files, as the old prompt-named downloads left them
+        os.makedirs("loose")
+        make_images("loose", IMAGES)
+        timed("import into the image store", lambda: handlers.store.import_folder("loose"))
+        cache = ThumbnailCache("thumbnails")
+        print(f"{IMAGES} images, {PAGE_SIZE} per page, {cache.workers} worker processes\n")
+
+        timed("every image resized (each rerun)", lambda: old_gallery("loose"))
+        timed("page 1, cold thumbnails", lambda: paged_gallery(cache))
+        timed("page 1, warm thumbnails", lambda: paged_gallery(cache))
+        timed("page 2, cold thumbnails", lambda: paged_gallery(cache, 2))
+        timed("search 'siamese cat', page 1", lambda: paged_gallery(cache, query="siamese cat"))
+        cache.close()
+
+        thumbnail_bytes = sum(entry.stat().st_size for entry in os.scandir(cache.directory))
+        image_bytes = sum(entry.stat().st_size for entry in os.scandir("loose"))
+        print(f"\n{cache.generated} thumbnails, {thumbnail_bytes / cache.generated / 1024:.0f} KiB each "
+              f"(full images {image_bytes / IMAGES / 1024:.0f} KiB)")
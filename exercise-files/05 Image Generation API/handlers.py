@@ -1,64 +1,124 @@
 # https://platform.openai.com/docs/guides/images/usage
+import base64
 import openai
-from PIL import Image
 import os
 import requests
-import ssl
+import time
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
+from image_store import ImageStore
+from prompt_cache import REUSE_WITHIN_TTL, PromptCache
 
 
 # Specify the folder path
 folder_path = "media"
+MODEL = "dall-e-3"
+SIZE = "1024x1024"
+QUALITY = "standard"
+# "b64_json" returns the image in the API response; "url" needs a second request to download it
+RESPONSE_FORMAT = "b64_json"
+DOWNLOAD_TIMEOUT = (5, 30)  # seconds to connect, seconds between bytes
+CHUNK_SIZE = 64 * 1024
+# Repeated prompts get the stored image: "always", "ttl" (within CACHE_TTL) or "fresh"
+CACHE_POLICY = REUSE_WITHIN_TTL
+CACHE_TTL = 7 * 24 * 60 * 60
+IMAGE_BUDGET_BYTES = None  # e.g. 2 * 1024**3 to delete the least recently used images beyond 2 GiB
 
 load_dotenv()
 client = openai.OpenAI()
 
+# Images are saved under their SHA-256 and listed from the index, not from the folder
+store = ImageStore(folder_path, "images.db")
+if store.count() == 0:
+    store.import_folder(folder_path)
+prompt_cache = PromptCache(store, policy=CACHE_POLICY, ttl=CACHE_TTL, max_bytes=IMAGE_BUDGET_BYTES)
+
+# One pooled session, so downloads reuse TLS connections to the image host
+session = requests.Session()
+adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+session.mount("https://", adapter)
+session.mount("http://", adapter)
+
 
 def downloadFile(user_input, url):
-    """Download a file from a URL"""
+    """Download a file from a URL into the image store and return its record"""
     try:
-        # It's recommended to verify SSL certificates
-        ssl._create_default_https_context = ssl._create_unverified_context
-        r = requests.get(url, allow_redirects=True)
-        r.raise_for_status()  # Raise HTTPError for bad responses (4xx and 5xx)
-
-        # Process the save path
-        file_path = os.path.join(
-            "media", os.path.basename("image_" + user_input.replace(" ", "_")) + ".png"
-        )
-
-        with open(file_path, "wb") as f:
-            f.write(r.content)
-        return f"File downloaded successfully and saved to {file_path}"
+        with session.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT) as r:
+            r.raise_for_status()  # Raise HTTPError for bad responses (4xx and 5xx)
+            # Written to disk chunk by chunk and saved under the hash of its content
+            record = store.add_stream(r.iter_content(CHUNK_SIZE), user_input, model=MODEL, size=SIZE, quality=QUALITY)
+        return record
 
     except requests.RequestException as e:
         print(f"An error occurred while downloading the file: {e}")
 
 
-def get_files():
-    """Get all image files in the folder"""
-    # List all files in the folder
-    files = os.listdir(folder_path)
-    images = []
-    # Filter out image files (assuming JPEG and PNG formats)
-    image_files = [f for f in files if f.endswith(".jpg") or f.endswith(".png")]
+def decode_base64(data, chunk_size=CHUNK_SIZE):
+    """Decodes base64 text piece by piece (each piece a multiple of 4 characters) instead of all at once"""
+    step = chunk_size // 3 * 4
+    for start in range(0, len(data), step):
+        yield base64.b64decode(data[start : start + step])
+
+
+def save_image(user_input, image):
+    """Save a generated image (b64_json or url) to the image store and return its record"""
+    if image.b64_json:
+        return store.add_stream(decode_base64(image.b64_json), user_input, model=MODEL, size=SIZE, quality=QUALITY)
+    return downloadFile(user_input, image.url)
+
+
+def get_files(limit=12, cursor=None, query=None):
+    """
+    Get a page of saved images, newest first, or best matches first when searching the prompts.
+
+    Returns (images, cursor of the next page), the cursor being None on the last page.
+    """
+    if query:
+        images = store.search(query, limit, cursor)
+    else:
+        images = store.recent(limit, cursor)
+    for image in images:
+        image["title"] = image["prompt"] if len(image["prompt"]) <= 60 else image["prompt"][:57] + "..."
+    return images, images[-1]["cursor"] if len(images) == limit else None
+
+
+def count_files(query=None):
+    return store.count(query)
+
+
+def generate_and_save(user_input, variation=0, policy=None):
+    """
+    Return a stored image for the prompt, generating and saving one unless the cache has it; runs on a job queue worker.
+
+    The record's "cached" flag tells which it was, with "seconds_saved" for a cache hit.
+    """
+    started = time.perf_counter()
+    key, record = prompt_cache.lookup(user_input, MODEL, SIZE, QUALITY, variation, policy)
+    if record is not None:
+        record["cached"] = True
+        return record
+
+    record = save_image(user_input, generate_image(user_input))
+    if record is None:
+        raise RuntimeError("the image could not be downloaded")
+    prompt_cache.remember(key, record, time.perf_counter() - started)
+    record["cached"] = False
+    return record
+
 
-    # Display each image
-    for image_file in image_files:
-        image_path = os.path.join(folder_path, image_file)
-        image = Image.open(image_path)
-        images.append({"file": image, "title": image_file})
-    return images
+def cache_stats():
+    return prompt_cache.stats()
 
 
-def generate_image(user_input="a white siamese cat"):
-    """Generate an image based on the user input"""
+def generate_image(user_input="a white siamese cat", response_format=RESPONSE_FORMAT):
+    """Generate an image based on the user input; returns the image (its url or b64_json)"""
     response = client.images.generate(
-        model="dall-e-3",
+        model=MODEL,
         prompt=user_input,
-        size="1024x1024",
-        quality="standard",
+        size=SIZE,
+        quality=QUALITY,
         n=1,
+        response_format=response_format,
         )
 
-    return response.data[0].url
+    return response.data[0]
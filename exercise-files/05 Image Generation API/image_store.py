@@ -0,0 +1,315 @@
+# Content-addressed image files with a SQLite index
+# https://www.sqlite.org/fts5.html
+import hashlib
+import io
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from PIL import Image
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    id INTEGER PRIMARY KEY,
+    sha256 TEXT NOT NULL UNIQUE,
+    path TEXT NOT NULL,
+    prompt TEXT NOT NULL,
+    model TEXT,
+    size TEXT,
+    quality TEXT,
+    width INTEGER,
+    height INTEGER,
+    bytes INTEGER NOT NULL,
+    created REAL NOT NULL
+);
+-- gallery pages seek on (created, id), which tells apart images saved in the same instant
+CREATE INDEX IF NOT EXISTS images_by_created_id ON images (created, id);
+DROP INDEX IF EXISTS images_by_created;
+"""
+
+# Prompt cache bookkeeping (see prompt_cache.py), added to indexes created before it existed
+CACHE_COLUMNS = {
+    "prompt_key": "TEXT",
+    "generation_seconds": "REAL",
+    "last_used": "REAL",
+    "hits": "INTEGER NOT NULL DEFAULT 0",
+}
+CACHE_SCHEMA = """
+CREATE INDEX IF NOT EXISTS images_by_prompt_key ON images (prompt_key, created);
+CREATE INDEX IF NOT EXISTS images_by_last_used ON images (last_used);
+"""
+
+# Full-text index over the prompts, kept in step with the images table by triggers
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS prompts USING fts5(prompt, content='images', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS images_ai AFTER INSERT ON images BEGIN
+    INSERT INTO prompts (rowid, prompt) VALUES (new.id, new.prompt);
+END;
+CREATE TRIGGER IF NOT EXISTS images_ad AFTER DELETE ON images BEGIN
+    INSERT INTO prompts (prompts, rowid, prompt) VALUES ('delete', old.id, old.prompt);
+END;
+"""
+
+COLUMNS = (
+    "id, sha256, path, prompt, model, size, quality, width, height, bytes, created, "
+    "prompt_key, generation_seconds, last_used, hits"
+)
+EXTENSIONS = {"PNG": ".png", "JPEG": ".jpg", "WEBP": ".webp"}
+
+
+def fts_query(text):
+    # every word is quoted, so characters such as - or * in a prompt are not read as FTS syntax
+    return " ".join('"' + word.replace('"', '""') + '"' for word in text.split())
+
+
+class ImageStore:
+    """
+    Image files named by the SHA-256 of their content, with a SQLite index of their metadata.
+
+    A file lives at `<root>/<2 hex>/<2 hex>/<sha256>.<ext>`, so no directory
+    grows past a few hundred entries and saving the same image twice stores
+    it once. The index holds the prompt, model, size, quality, dimensions and
+    creation time of each image: the gallery pages through it by recency and
+    searches the prompts with full-text search instead of listing directories.
+    Safe to use from several threads.
+    """
+
+    def __init__(self, root="media", index_path="images.db"):
+        self.root = root
+        self.index_path = index_path
+        self.local = threading.local()
+        self.write_lock = threading.Lock()
+        self.conn.executescript(SCHEMA)
+        existing = {row[1] for row in self.conn.execute("PRAGMA table_info(images)")}
+        with self.conn as conn:
+            for name, definition in CACHE_COLUMNS.items():
+                if name not in existing:
+                    conn.execute(f"ALTER TABLE images ADD COLUMN {name} {definition}")
+            conn.execute("UPDATE images SET last_used = created WHERE last_used IS NULL")
+        self.conn.executescript(CACHE_SCHEMA)
+        try:
+            self.conn.executescript(FTS_SCHEMA)
+            self.fts = True
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5: search falls back to LIKE
+            self.fts = False
+
+    @property
+    def conn(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.index_path)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self.local.conn = conn
+        return conn
+
+    def path_for(self, sha256, extension):
+        return os.path.join(self.root, sha256[:2], sha256[2:4], sha256 + extension)
+
+    def add(self, data, prompt, model=None, size=None, quality=None):
+        """Stores image bytes and returns their record; an image already stored is not written again"""
+        sha256 = hashlib.sha256(data).hexdigest()
+        with Image.open(io.BytesIO(data)) as image:
+            dimensions, extension = image.size, EXTENSIONS.get(image.format, ".png")
+        path = self.path_for(sha256, extension)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temporary = f"{path}.{threading.get_ident()}.tmp"
+            with open(temporary, "wb") as file:
+                file.write(data)
+            os.replace(temporary, path)
+        return self._index(sha256, path, prompt, model, size, quality, dimensions, len(data))
+
+    def add_stream(self, chunks, prompt, model=None, size=None, quality=None):
+        """
+        Stores an image arriving in pieces (e.g. a streamed download) and returns its record.
+
+        The pieces are hashed as they are written to a temporary file next to
+        the store, which is then renamed into place, so the image is never held
+        in memory whole. The temporary file is removed if anything fails.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        temporary = os.path.join(self.root, f".incoming-{uuid.uuid4().hex}.tmp")
+        digest = hashlib.sha256()
+        length = 0
+        try:
+            with open(temporary, "wb") as file:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    file.write(chunk)
+                    length += len(chunk)
+            with Image.open(temporary) as image:
+                dimensions, extension = image.size, EXTENSIONS.get(image.format, ".png")
+            sha256 = digest.hexdigest()
+            path = self.path_for(sha256, extension)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temporary, path)
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+        return self._index(sha256, path, prompt, model, size, quality, dimensions, length)
+
+    def add_file(self, source, prompt, model=None, size=None, quality=None, move=True):
+        """Stores an image file (hashed in chunks, never read whole) and returns its record"""
+        digest = hashlib.sha256()
+        with open(source, "rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                digest.update(block)
+        sha256 = digest.hexdigest()
+        with Image.open(source) as image:
+            dimensions, extension = image.size, EXTENSIONS.get(image.format, ".png")
+        path = self.path_for(sha256, extension)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            if move:
+                os.remove(source)
+        elif move:
+            os.replace(source, path)
+        else:
+            shutil.copyfile(source, path + ".tmp")
+            os.replace(path + ".tmp", path)
+        return self._index(sha256, path, prompt, model, size, quality, dimensions, os.path.getsize(path))
+
+    def _index(self, sha256, path, prompt, model, size, quality, dimensions, length):
+        relative = os.path.relpath(path, self.root)
+        now = time.time()
+        with self.write_lock, self.conn as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO images (sha256, path, prompt, model, size, quality, width, height, bytes, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (sha256, relative, prompt, model, size, quality, dimensions[0], dimensions[1], length, now, now),
+            )
+        return self.get(sha256)
+
+    def _record(self, row):
+        record = dict(row)
+        record["path"] = os.path.join(self.root, record["path"])
+        return record
+
+    def get(self, sha256):
+        row = self.conn.execute(f"SELECT {COLUMNS} FROM images WHERE sha256 = ?", (sha256,)).fetchone()
+        return self._record(row) if row else None
+
+    def _page(self, rows, cursor):
+        records = []
+        for row in rows:
+            record = self._record(row)
+            record["cursor"] = cursor(row)
+            records.append(record)
+        return records
+
+    def recent(self, limit=12, before=None):
+        """
+        Newest images first, read from the index on (created, id).
+
+        Each record has a `cursor`: pass the last one of a page as `before` to
+        get the next page with a single index seek, however far back it is.
+        """
+        if before is None:
+            rows = self.conn.execute(f"SELECT {COLUMNS} FROM images ORDER BY created DESC, id DESC LIMIT ?", (limit,))
+        else:
+            rows = self.conn.execute(
+                f"SELECT {COLUMNS} FROM images WHERE (created, id) < (?, ?) ORDER BY created DESC, id DESC LIMIT ?",
+                (*before, limit),
+            )
+        return self._page(rows, lambda row: (row["created"], row["id"]))
+
+    def search(self, text, limit=12, after=None):
+        """
+        Images whose prompt contains all the words of `text`, best matches first.
+
+        Paged like `recent()`: pass the `cursor` of the last record of a page
+        as `after` to get the next one.
+        """
+        if not text.split():
+            return self.recent(limit, after)
+        if self.fts:
+            # bm25() is lower for better matches, so ascending order puts the best first; the cursor compares it
+            # (the `rank` column cannot be used in WHERE) and ties are ordered by id
+            columns = ", ".join("images." + c.strip() for c in COLUMNS.split(","))
+            where, parameters = "prompts MATCH ?", [fts_query(text)]
+            if after is not None:
+                where += " AND (bm25(prompts), images.id) > (?, ?)"
+                parameters += after
+            rows = self.conn.execute(
+                f"SELECT {columns}, bm25(prompts) AS score FROM prompts JOIN images ON images.id = prompts.rowid "
+                f"WHERE {where} ORDER BY score, images.id LIMIT ?",
+                parameters + [limit],
+            )
+            return self._page(rows, lambda row: (row["score"], row["id"]))
+        words = text.split()
+        where, parameters = " AND ".join(["prompt LIKE ?"] * len(words)), [f"%{word}%" for word in words]
+        if after is not None:
+            where += " AND (created, id) < (?, ?)"
+            parameters += after
+        rows = self.conn.execute(
+            f"SELECT {COLUMNS} FROM images WHERE {where} ORDER BY created DESC, id DESC LIMIT ?", parameters + [limit]
+        )
+        return self._page(rows, lambda row: (row["created"], row["id"]))
+
+    def count(self, text=None):
+        if not text or not text.split():
+            return self.conn.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+        if self.fts:
+            return self.conn.execute("SELECT COUNT(*) FROM prompts WHERE prompts MATCH ?", (fts_query(text),)).fetchone()[0]
+        words = text.split()
+        return self.conn.execute(
+            f"SELECT COUNT(*) FROM images WHERE {' AND '.join(['prompt LIKE ?'] * len(words))}",
+            [f"%{word}%" for word in words],
+        ).fetchone()[0]
+
+    def import_folder(self, folder):
+        """
+        Indexes loose images saved by the old prompt-named downloads (image_<prompt>.png).
+
+        The files are copied in, not moved, and the prompt is recovered from
+        the file name. Returns the number of images added.
+        """
+        added = 0
+        for entry in os.scandir(folder):
+            if entry.is_file() and entry.name.endswith((".jpg", ".png")):
+                prompt = os.path.splitext(entry.name)[0].removeprefix("image_").replace("_", " ")
+                before = self.count()
+                self.add_file(entry.path, prompt, move=False)
+                added += self.count() - before
+        return added
+
+    def find(self, prompt_key, newer_than=None):
+        """Newest image stored for a prompt cache key (created after `newer_than`, if given), or None"""
+        row = self.conn.execute(
+            f"SELECT {COLUMNS} FROM images WHERE prompt_key = ? AND created > ? ORDER BY created DESC LIMIT 1",
+            (prompt_key, newer_than or 0),
+        ).fetchone()
+        return self._record(row) if row else None
+
+    def tag(self, sha256, prompt_key, generation_seconds):
+        """Records the cache key an image answers and how long it took to generate"""
+        with self.write_lock, self.conn as conn:
+            conn.execute(
+                "UPDATE images SET prompt_key = ?, generation_seconds = ? WHERE sha256 = ?",
+                (prompt_key, generation_seconds, sha256),
+            )
+
+    def touch(self, sha256):
+        with self.write_lock, self.conn as conn:
+            conn.execute("UPDATE images SET last_used = ?, hits = hits + 1 WHERE sha256 = ?", (time.time(), sha256))
+
+    def total_bytes(self):
+        return self.conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM images").fetchone()[0]
+
+    def least_recently_used(self):
+        """(sha256, bytes) of every image, least recently generated or reused first"""
+        return self.conn.execute("SELECT sha256, bytes FROM images ORDER BY last_used").fetchall()
+
+    def delete(self, sha256):
+        """Removes an image file and its index entry"""
+        record = self.get(sha256)
+        if record is None:
+            return
+        with self.write_lock, self.conn as conn:
+            conn.execute("DELETE FROM images WHERE sha256 = ?", (sha256,))
+        if os.path.exists(record["path"]):
+            os.remove(record["path"])
@@ -0,0 +1,104 @@
+# Background image generation: a bounded queue drained by a pool of worker threads
+from collections import deque
+from dataclasses import dataclass
+import itertools
+import queue
+import statistics
+import threading
+import time
+
+
+@dataclass
+class Job:
+    id: int
+    prompt: str
+    options: dict = None  # keyword arguments for `run`
+    status: str = "queued"  # queued, running, done or failed
+    submitted: float = 0.0
+    started: float = None
+    finished: float = None
+    result: object = None
+    error: str = None
+
+    @property
+    def latency(self):
+        """Seconds from submission to completion, queueing included"""
+        return self.finished - self.submitted if self.finished else None
+
+
+class JobQueue:
+    """
+    Runs `run(prompt, variation=i, **options)` for submitted prompts on `workers` threads.
+
+    At most `max_queued` jobs wait at a time; `submit()` raises queue.Full
+    beyond that instead of letting a burst pile up. Callers keep the job ids
+    and poll `get()` for their status, so nothing blocks while a job runs.
+    Finished jobs are forgotten after `keep_finished` newer ones.
+    """
+
+    def __init__(self, run, workers=4, max_queued=32, keep_finished=500):
+        self.run = run
+        self.pending = queue.Queue(maxsize=max_queued)
+        self.jobs = {}
+        self.finished = deque(maxlen=keep_finished)  # ids, oldest first
+        self.latencies = deque(maxlen=200)
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.running = 0
+        self.failed = 0
+        self.threads = [threading.Thread(target=self._work, daemon=True) for _ in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, prompt, n=1, **options):
+        """Queues `n` variations of a prompt as separate jobs and returns their ids"""
+        with self.lock:
+            # all or nothing: the check and the puts happen under the lock, and workers only take jobs out
+            free = self.pending.maxsize - self.pending.qsize()
+            if free < n:
+                raise queue.Full(f"only {free} job slots free")
+            ids = []
+            for variation in range(n):
+                job = Job(next(self.ids), prompt, {**options, "variation": variation}, submitted=time.time())
+                self.jobs[job.id] = job
+                self.pending.put_nowait(job)
+                ids.append(job.id)
+            return ids
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def _work(self):
+        while True:
+            job = self.pending.get()
+            with self.lock:
+                job.status, job.started = "running", time.time()
+                self.running += 1
+            try:
+                result, error, status = self.run(job.prompt, **job.options), None, "done"
+            except Exception as e:
+                result, error, status = None, str(e), "failed"
+            with self.lock:
+                job.result, job.error, job.status, job.finished = result, error, status, time.time()
+                self.running -= 1
+                if status == "failed":
+                    self.failed += 1
+                self.latencies.append(job.latency)
+                if len(self.finished) == self.finished.maxlen:
+                    self.jobs.pop(self.finished[0], None)
+                self.finished.append(job.id)
+            self.pending.task_done()
+
+    def stats(self):
+        """Queue depth, jobs in flight and latency of recent jobs, for monitoring"""
+        with self.lock:
+            latencies = sorted(self.latencies)
+            return {
+                "queued": self.pending.qsize(),
+                "in_flight": self.running,
+                "finished": len(self.finished),
+                "failed": self.failed,
+                "latency_p50": round(statistics.median(latencies), 2) if latencies else None,
+                "latency_p95": round(latencies[int(0.95 * (len(latencies) - 1))], 2) if latencies else None,
+            }
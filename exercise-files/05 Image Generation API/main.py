@@ -1,46 +1,123 @@
 # https://platform.openai.com/docs/guides/images/usage
 
+import math
+import queue
+import time
 import streamlit as st
-from handlers import downloadFile, generate_image, get_files
+from handlers import cache_stats, count_files, generate_and_save, get_files
+from jobs import JobQueue
+from prompt_cache import FORCE_FRESH, REUSE_ALWAYS, REUSE_WITHIN_TTL
+from thumbnails import ThumbnailCache
 
-desired_size = (600, 400)
-
-# Streamlit App
-st.title("🖼️ Image Generation Gallery ✨")  # Add a title
+PAGE_SIZE = 12  # images per gallery page, two per row
+POLL_INTERVAL = 1.0  # seconds between reruns while this session has jobs running
+MAX_VARIATIONS = 4
+CACHE_CHOICES = {
+    "Reuse recent images of the same prompt": REUSE_WITHIN_TTL,
+    "Reuse any image of the same prompt": REUSE_ALWAYS,
+    "Always generate a new image": FORCE_FRESH,
+}
 margin = '<div style="margin: 20px 5px;"></div>'
 
-# User input
-with st.form("user_form", clear_on_submit=True):
-    user_input = st.text_input("Type something")
-    submit_button = st.form_submit_button(label="Send")
 
-# Press Enter to generate response from chatbot
-if submit_button:
-    # print(image)
-    with st.spinner("Generating image..."):
-        image = generate_image(user_input)
-        st.image(image, use_column_width = True) #displays image
-        saved_image = downloadFile(user_input, image)
-        st.success("Image generated successfully")
+@st.cache_resource
+def get_thumbnails():
+    """One thumbnail cache (and worker pool) per server process"""
+    return ThumbnailCache()
+
+
+@st.cache_resource
+def get_jobs():
+    """One generation queue per server process, shared by every browser session"""
+    return JobQueue(generate_and_save, workers=4, max_queued=32)
+
+
+def image_form():
+    # User input: one prompt per line, each generated `variations` times
+    with st.form("user_form", clear_on_submit=True):
+        user_input = st.text_area("Type something (one prompt per line)")
+        variations = st.number_input("Variations per prompt", min_value=1, max_value=MAX_VARIATIONS, value=1)
+        cache_choice = st.selectbox("Cache", list(CACHE_CHOICES))
+        submit_button = st.form_submit_button(label="Send")
+
+    # Queue the prompts; the images are generated in the background
+    if submit_button:
+        st.session_state.setdefault("job_ids", [])
+        for prompt in [line.strip() for line in user_input.splitlines() if line.strip()]:
+            try:
+                st.session_state.job_ids += get_jobs().submit(prompt, n=variations, policy=CACHE_CHOICES[cache_choice])
+            except queue.Full:
+                st.warning(f"The queue is full, try again shortly: {prompt}")
+
+
+def display_jobs():
+    """Shows this session's jobs; returns True while any of them is still queued or running"""
+    jobs = [get_jobs().get(job_id) for job_id in st.session_state.get("job_ids", [])]
+    jobs = [job for job in jobs if job is not None]
+    for job in reversed(jobs[-MAX_VARIATIONS * 4 :]):
+        if job.status == "done":
+            if job.result["cached"]:
+                caption = f"{job.prompt}: served from cache in {job.latency:.1f}s, {job.result['seconds_saved']:.1f}s saved"
+            else:
+                caption = f"{job.prompt}: freshly generated in {job.latency:.1f}s"
+            st.image(job.result["path"], use_column_width = True, caption=caption) #displays image
+        elif job.status == "failed":
+            st.error(f"{job.prompt}: {job.error}")
+        else:
+            st.info(f"{job.prompt}: {job.status}...")
+    return any(job.status in ("queued", "running") for job in jobs)
+
+
+def display_stats():
+    stats = get_jobs().stats()
+    st.sidebar.subheader("Generation queue")
+    st.sidebar.metric("Queued", stats["queued"])
+    st.sidebar.metric("In flight", stats["in_flight"])
+    if stats["latency_p50"] is not None:
+        st.sidebar.metric("Latency p50 / p95", f"{stats['latency_p50']}s / {stats['latency_p95']}s")
+    st.sidebar.caption(f"{stats['finished']} finished, {stats['failed']} failed")
+    cache = cache_stats()
+    st.sidebar.subheader("Image cache")
+    st.sidebar.metric("Served from cache", f"{cache['hits']} of {cache['hits'] + cache['misses']}")
+    st.sidebar.metric("Generation time saved", f"{cache['seconds_saved']}s")
+
 
 def display_gallery():
-    """Display all images in the gallery"""
-    images = get_files()
-    length = len(images)
+    """Display one page of the gallery; only that page's thumbnails are loaded"""
+    query = st.text_input("Search prompts")
+    total = count_files(query)
+    if not total:
+        return
+    # Pages are read by cursor (where the last page ended), not by offset, so any page costs one index seek;
+    # the cursors of the pages seen so far are kept to step back
+    if st.session_state.get("gallery_query") != query:
+        st.session_state.gallery_query = query
+        st.session_state.gallery_cursors = [None]
+    cursors = st.session_state.gallery_cursors
+    visible, next_cursor = get_files(PAGE_SIZE, cursors[-1], query)
+    pages = math.ceil(total / PAGE_SIZE)
+    if pages > 1:
+        previous, position, following = st.columns([1, 2, 1])
+        previous.button("Newer", disabled=len(cursors) == 1, on_click=cursors.pop)
+        position.caption(f"Page {len(cursors)} of {pages}")
+        following.button("Older", disabled=next_cursor is None, on_click=cursors.append, args=(next_cursor,))
+    thumbnails = get_thumbnails().get_many([image["path"] for image in visible])
 
-    for i in range(length):
+    for row in range(0, len(visible), 2):
         with st.container():
-            col1, col2 = st.columns(2)
-
-            with col1:
-                if i < length:
-                    image_resized = images[i]["file"].resize(desired_size)
-                    st.image(image_resized, use_column_width=True, caption = images[i]["title"])
-            with col2:
-                if i < length+1:
-                    image_resized = images[i+1]["file"].resize(desired_size)
-                    st.image(image_resized, use_column_width=True, caption = images[i+1]["title"])
+            for column, i in zip(st.columns(2), range(row, min(row + 2, len(visible)))):
+                with column:
+                    st.image(thumbnails[i], use_column_width=True, caption=visible[i]["title"])
 
 
 if __name__ == "__main__":
+    # Streamlit App
+    st.title("🖼️ Image Generation Gallery ✨")  # Add a title
+    image_form()
+    pending = display_jobs()
+    display_stats()
     display_gallery()
+    # poll: rerun while jobs are in progress (a click is picked up within POLL_INTERVAL)
+    if pending:
+        time.sleep(POLL_INTERVAL)
+        st.experimental_rerun()
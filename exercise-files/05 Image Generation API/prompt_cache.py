@@ -0,0 +1,100 @@
+# Reuse of already generated images for repeated prompts
+import hashlib
+import json
+import os
+import threading
+import time
+
+# Cache policies
+REUSE_ALWAYS = "always"  # any stored image for the same request
+REUSE_WITHIN_TTL = "ttl"  # only images generated less than `ttl` seconds ago
+FORCE_FRESH = "fresh"  # always generate, but remember the result for later requests
+POLICIES = (REUSE_ALWAYS, REUSE_WITHIN_TTL, FORCE_FRESH)
+
+
+def normalize_prompt(prompt):
+    """Case, spacing and trailing punctuation do not change the image that was asked for"""
+    return " ".join(prompt.casefold().split()).rstrip(" .!")
+
+
+class PromptCache:
+    """
+    Maps a request (normalized prompt, model, size, quality, variation) to an image already in the ImageStore.
+
+    Each variation slot of a prompt is cached separately, so asking again for
+    three variations returns the same three images rather than one image
+    three times. With `max_bytes`, the store is trimmed back under 90% of the
+    budget after each new image, least recently generated or reused first;
+    the default of None never deletes anything.
+    """
+
+    def __init__(self, store, policy=REUSE_WITHIN_TTL, ttl=7 * 24 * 60 * 60, max_bytes=None):
+        if policy not in POLICIES:
+            raise ValueError(f"policy must be one of {POLICIES}")
+        self.store = store
+        self.policy = policy
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0, "seconds_saved": 0.0}
+
+    @staticmethod
+    def key(prompt, model, size, quality, variation=0):
+        request = [normalize_prompt(prompt), model, size, quality, variation]
+        return hashlib.sha256(json.dumps(request, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt, model, size, quality, variation=0, policy=None):
+        """Returns (key, stored record or None) under `policy` (the cache's own by default)"""
+        started = time.perf_counter()
+        policy = policy or self.policy
+        key = self.key(prompt, model, size, quality, variation)
+        record = None
+        if policy != FORCE_FRESH:
+            newer_than = time.time() - self.ttl if policy == REUSE_WITHIN_TTL else None
+            record = self.store.find(key, newer_than)
+            if record is not None and not os.path.exists(record["path"]):
+                # the file was removed behind the store's back
+                self.store.delete(record["sha256"])
+                record = None
+        if record is None:
+            with self.lock:
+                self.counters["misses"] += 1
+            return key, None
+
+        self.store.touch(record["sha256"])
+        saved = max(0.0, (record["generation_seconds"] or 0.0) - (time.perf_counter() - started))
+        record["seconds_saved"] = saved
+        with self.lock:
+            self.counters["hits"] += 1
+            self.counters["seconds_saved"] += saved
+        return key, record
+
+    def remember(self, key, record, generation_seconds):
+        """Files a freshly generated image under its request key, then keeps the store within budget"""
+        self.store.tag(record["sha256"], key, generation_seconds)
+        record["prompt_key"], record["generation_seconds"] = key, generation_seconds
+        if self.max_bytes is not None and self.store.total_bytes() > self.max_bytes:
+            self._evict(keep=record["sha256"])
+
+    def _evict(self, keep):
+        total = self.store.total_bytes()
+        evicted = 0
+        for sha256, size in self.store.least_recently_used():
+            if total <= self.max_bytes * 0.9:
+                break
+            if sha256 == keep:
+                continue
+            self.store.delete(sha256)
+            total -= size
+            evicted += 1
+        with self.lock:
+            self.counters["evictions"] += evicted
+
+    def stats(self):
+        with self.lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return {
+                **self.counters,
+                "seconds_saved": round(self.counters["seconds_saved"], 1),
+                "hit_rate": round(self.counters["hits"] / lookups, 3) if lookups else 0.0,
+            }
@@ -0,0 +1,91 @@
+# On-disk thumbnail cache for the gallery
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import os
+import threading
+from PIL import Image, features
+
+THUMBNAIL_DIR = ".thumbnails"
+THUMBNAIL_SIZE = (600, 400)  # bounding box; the aspect ratio is kept
+# WebP is about a third smaller than JPEG at the same quality; fall back if Pillow was built without it
+THUMBNAIL_FORMAT = "WEBP" if features.check("webp") else "JPEG"
+THUMBNAIL_QUALITY = 80
+
+
+def make_thumbnail(image_path, thumbnail_path, size=THUMBNAIL_SIZE, format=THUMBNAIL_FORMAT):
+    """Writes a thumbnail of an image; runs in a worker process"""
+    with Image.open(image_path) as image:
+        image.draft("RGB", size)  # JPEG sources are decoded at reduced scale
+        image = image.convert("RGB")
+        image.thumbnail(size, Image.LANCZOS)
+        # write-then-rename, so a reader never sees a half-written thumbnail
+        temporary = f"{thumbnail_path}.{os.getpid()}.tmp"
+        image.save(temporary, format, quality=THUMBNAIL_QUALITY)
+    os.replace(temporary, thumbnail_path)
+    return thumbnail_path
+
+
+class ThumbnailCache:
+    """
+    Thumbnails of the gallery images, generated on first request and kept on disk.
+
+    A thumbnail is named after a hash of the image's path, modification time
+    and file size, so an image that is replaced or edited gets a new one, and
+    an unchanged image is never decoded again. Missing thumbnails are made in
+    a process pool, several at a time; the full-size images are only opened
+    there, never in the app process.
+    """
+
+    def __init__(self, directory=THUMBNAIL_DIR, size=THUMBNAIL_SIZE, workers=None):
+        self.directory = directory
+        self.size = size
+        self.workers = workers or os.cpu_count()
+        self.pool = None
+        self.lock = threading.Lock()
+        self.generated = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, image_path):
+        stat = os.stat(image_path)
+        key = f"{os.path.abspath(image_path)}|{stat.st_mtime_ns}|{stat.st_size}|{self.size[0]}x{self.size[1]}"
+        name = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{name}.{THUMBNAIL_FORMAT.lower()}")
+
+    def get_many(self, image_paths):
+        """Returns the thumbnail path of each image, generating the missing ones in parallel"""
+        thumbnails = [self.path_for(path) for path in image_paths]
+        missing = [(path, thumb) for path, thumb in zip(image_paths, thumbnails) if not os.path.exists(thumb)]
+        if missing:
+            pool = self._pool()
+            futures = [pool.submit(make_thumbnail, path, thumb, self.size) for path, thumb in missing]
+            for future in futures:
+                future.result()
+            with self.lock:
+                self.generated += len(missing)
+        return thumbnails
+
+    def get(self, image_path):
+        return self.get_many([image_path])[0]
+
+    def _pool(self):
+        # started on first use, so pages whose thumbnails all exist never start any process
+        with self.lock:
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self.pool
+
+    def prune(self, image_paths):
+        """Deletes thumbnails that no longer belong to any of `image_paths`; returns how many were removed"""
+        keep = {os.path.basename(self.path_for(path)) for path in image_paths}
+        removed = 0
+        for entry in os.scandir(self.directory):
+            if entry.name not in keep:
+                os.remove(entry.path)
+                removed += 1
+        return removed
+
+    def close(self):
+        with self.lock:
+            if self.pool is not None:
+                self.pool.shutdown()
+                self.pool = None
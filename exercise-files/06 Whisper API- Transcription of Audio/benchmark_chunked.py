@@ -0,0 +1,56 @@
+# Benchmark: real-time factor of model.transcribe() vs ChunkedTranscriber with 1, 2, 4, ... workers
+# Usage: python benchmark_chunked.py [model size] [minutes of audio] [chunk seconds]
+# The long recording is made by repeating the testimonials in media/; RTF = processing time / audio duration
+import difflib
+import glob
+import os
+import sys
+import time
+import numpy as np
+import whisper
+from whisper.audio import SAMPLE_RATE
+from chunked import CHUNK_SECONDS, ChunkedTranscriber, _detect_language
+
+
+def long_recording(minutes):
+    clips = [whisper.load_audio(path) for path in sorted(glob.glob("media/*.mp3"))]
+    pause = np.zeros(SAMPLE_RATE, dtype=np.float32)
+    pieces, length = [], 0
+    while length < minutes * 60 * SAMPLE_RATE:
+        for clip in clips:
+            pieces += [clip, pause]
+            length += len(clip) + len(pause)
+    return np.concatenate(pieces)
+
+
+def report(label, seconds, duration, text, reference):
+    similarity = difflib.SequenceMatcher(None, text.split(), reference.split()).ratio() if reference else 1.0
+    print(f"{label:<26} {seconds:7.1f}s   RTF {seconds / duration:5.2f}   same words as sequential {similarity:5.0%}")
+
+
+if __name__ == "__main__":
+    name = sys.argv[1] if len(sys.argv) > 1 else "base"
+    minutes = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+    chunk_seconds = float(sys.argv[3]) if len(sys.argv) > 3 else CHUNK_SECONDS
+    audio = long_recording(minutes)
+    duration = len(audio) / SAMPLE_RATE
+    print(f"whisper {name} on cpu, {duration / 60:.1f} min of audio, {os.cpu_count()} cores\n")
+
+    model = whisper.load_model(name, device="cpu")
+    started = time.perf_counter()
+    reference = model.transcribe(audio, fp16=False)["text"]
+    report("model.transcribe()", time.perf_counter() - started, duration, reference, None)
+    del model
+
+    workers = 1
+    while workers <= os.cpu_count():
+        transcriber = ChunkedTranscriber(name, workers=workers, chunk_seconds=chunk_seconds)
+        # start every worker and load its model before timing
+        pool = transcriber._pool()
+        for future in [pool.submit(_detect_language, audio[:SAMPLE_RATE]) for _ in range(workers)]:
+            future.result()
+        started = time.perf_counter()
+        text = transcriber.transcribe(audio)["text"]
+        report(f"chunked, {workers} worker(s)", time.perf_counter() - started, duration, text, reference)
+        transcriber.close()
+        workers *= 2
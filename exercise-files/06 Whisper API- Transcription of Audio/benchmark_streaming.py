@@ -0,0 +1,30 @@
+# Benchmark: time until the first text can be shown, model.transcribe() (all at the end) vs streamed segments
+# Usage: python benchmark_streaming.py [model size] [audio files...] (defaults: base, the testimonials in media/)
+import glob
+import sys
+import time
+import whisper
+from whisper.audio import SAMPLE_RATE
+from chunked import iter_segments
+
+if __name__ == "__main__":
+    name = sys.argv[1] if len(sys.argv) > 1 else "base"
+    paths = sys.argv[2:] or sorted(glob.glob("media/*.mp3"))
+    model = whisper.load_model(name)
+    fp16 = model.device.type == "cuda"
+    print(f"whisper {name} on {model.device}\n")
+
+    for path in paths:
+        audio = whisper.load_audio(path)
+        print(f"{path} ({len(audio) / SAMPLE_RATE:.0f}s of audio)")
+
+        started = time.perf_counter()
+        model.transcribe(audio, fp16=fp16)
+        whole = time.perf_counter() - started
+        print(f"  model.transcribe()   first text {whole:6.2f}s   complete {whole:6.2f}s")
+
+        started, first, count = time.perf_counter(), None, 0
+        for segment in iter_segments(model, audio):
+            first = first or time.perf_counter() - started
+            count += 1
+        print(f"  streamed segments    first text {first or 0:6.2f}s   complete {time.perf_counter() - started:6.2f}s   ({count} segments)")
@@ -0,0 +1,187 @@
+# Transcription in pieces split at pauses: in parallel processes for long recordings, or streamed piece by piece
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+import numpy as np
+import whisper
+from whisper.audio import SAMPLE_RATE
+
+FRAME = SAMPLE_RATE * 30 // 1000  # 30 ms analysis frames
+CHUNK_SECONDS = 120  # target length of a chunk
+SEARCH_SECONDS = 10  # how far from the target a cut may move to land on a pause
+OVERLAP_SECONDS = 1.0  # audio added on both sides of a chunk, so a word at a cut is heard whole
+STREAM_SECONDS = 25  # piece length when streaming, so each piece fits one 30 second window
+
+
+def frame_energy(audio):
+    """RMS energy of each 30 ms frame"""
+    frames = audio[: len(audio) // FRAME * FRAME].reshape(-1, FRAME)
+    return np.sqrt(np.mean(frames**2, axis=1))
+
+
+def split_at_silence(audio, chunk_seconds=CHUNK_SECONDS, search_seconds=SEARCH_SECONDS):
+    """
+    Returns (start, end) sample ranges covering `audio`, each about `chunk_seconds` long.
+
+    Every cut is moved to the quietest 300 ms within `search_seconds` of
+    where the chunk would otherwise end, so chunks break between words
+    rather than inside one.
+    """
+    # averaged over 10 frames, so a pause wins over a single quiet frame inside a word
+    energy = np.convolve(frame_energy(audio), np.ones(10) / 10, mode="same")
+    chunk, search = int(chunk_seconds * 1000 / 30), int(search_seconds * 1000 / 30)
+    cuts = [0]
+    while len(energy) - cuts[-1] > chunk + search:
+        target = cuts[-1] + chunk
+        low, high = target - search, target + search
+        cuts.append(low + int(np.argmin(energy[low:high])))
+    ranges = [(start * FRAME, end * FRAME) for start, end in zip(cuts, cuts[1:])]
+    return ranges + [(cuts[-1] * FRAME, len(audio))]
+
+
+# In each worker process: one model, loaded when the process starts
+_model = None
+
+
+def _load_model(model_name, threads):
+    global _model
+    import torch
+
+    torch.set_num_threads(threads)  # the workers share the cores instead of all using every one
+    _model = whisper.load_model(model_name, device="cpu")
+
+
+def _detect_language(samples):
+    mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(samples), _model.dims.n_mels)
+    _, probabilities = _model.detect_language(mel)
+    return max(probabilities, key=probabilities.get)
+
+
+def _transcribe_chunk(samples, offset, language):
+    """Transcribes one chunk; timestamps are shifted by `offset` seconds to refer to the whole recording"""
+    result = _model.transcribe(samples, language=language, fp16=False)
+    return [
+        {"start": segment["start"] + offset, "end": segment["end"] + offset, "text": segment["text"].strip()}
+        for segment in result["segments"]
+    ]
+
+
+def stitch(chunks):
+    """
+    Yields the segments of consecutive chunks in order, as the chunks come.
+
+    `chunks` yields (start, end, segments) with start and end the chunk's
+    own range in seconds, without the overlap. Speech in an overlap is
+    transcribed by both neighbours: each segment is kept only by the chunk
+    its midpoint falls in, and a segment repeating the text of the one
+    just before it is dropped.
+    """
+    previous = None
+    for start, end, segments in chunks:
+        for segment in segments:
+            if not start <= (segment["start"] + segment["end"]) / 2 < end:
+                continue
+            if previous and segment["text"].casefold() == previous["text"].casefold():
+                continue
+            previous = segment
+            yield segment
+
+
+def iter_segments(model, audio, piece_seconds=STREAM_SECONDS):
+    """
+    Transcribes `audio` (a path or 16 kHz samples) with one model and yields its segments as each piece is decoded.
+
+    The pieces are cut at pauses and fit one 30 second window, so the first
+    segments arrive after a single window instead of at the very end. Each
+    piece is prompted with the text before it and uses the language
+    detected on the first one.
+    """
+    return iter_borrowed_segments(lambda: nullcontext(model), audio, piece_seconds)
+
+
+def iter_borrowed_segments(borrow, audio, piece_seconds=STREAM_SECONDS):
+    """
+    Same as `iter_segments`, with the model lent by `borrow()` (e.g. `lambda: registry.use("base")`) for each piece.
+
+    The model is given back before the piece's segments are yielded, so a
+    caller that is slow to read them, or stops reading, does not keep it
+    from other requests or from being unloaded.
+    """
+    if isinstance(audio, str):
+        audio = whisper.load_audio(audio)
+    language, previous_text = None, None
+    for start, end in split_at_silence(audio, piece_seconds, search_seconds=piece_seconds / 5):
+        with borrow() as model:
+            fp16 = model.device.type == "cuda"
+            result = model.transcribe(audio[start:end], language=language, initial_prompt=previous_text, fp16=fp16)
+        language, offset = result["language"], start / SAMPLE_RATE
+        for segment in result["segments"]:
+            yield {"start": segment["start"] + offset, "end": segment["end"] + offset, "text": segment["text"].strip()}
+        previous_text = result["text"] or previous_text
+
+
+class ChunkedTranscriber:
+    """
+    Transcribes long recordings on several CPU cores at once.
+
+    Whisper works through a recording in 30 second windows, one after the
+    other. Here the audio is first split at pauses into chunks of about
+    `chunk_seconds`. The chunks go to a pool of `workers` processes, each
+    holding its own copy of the model and an equal share of the cores,
+    and the pieces are stitched back with timestamps that refer to the
+    whole recording. The pool starts on first use and keeps its models
+    loaded until `close()`.
+    """
+
+    def __init__(self, model_name="base", workers=None, chunk_seconds=CHUNK_SECONDS, overlap_seconds=OVERLAP_SECONDS):
+        self.model_name = model_name
+        self.workers = workers or os.cpu_count()
+        self.chunk_seconds = chunk_seconds
+        self.overlap_seconds = overlap_seconds
+        self.pool = None
+        self.lock = threading.Lock()
+
+    def _pool(self):
+        with self.lock:
+            if self.pool is None:
+                threads = max(1, os.cpu_count() // self.workers)
+                self.pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    # torch does not survive a fork once its threads have started
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_load_model,
+                    initargs=(self.model_name, threads),
+                )
+            return self.pool
+
+    def iter_transcribe(self, audio, language=None):
+        """Transcribes a path or 16 kHz samples, yielding segments in order as soon as the chunks before them are done"""
+        if isinstance(audio, str):
+            audio = whisper.load_audio(audio)
+        pool = self._pool()
+        ranges = split_at_silence(audio, self.chunk_seconds)
+        if language is None:
+            # detected once on the first chunk, so every chunk is transcribed in the same language
+            language = "en" if self.model_name.endswith(".en") else pool.submit(_detect_language, audio[: ranges[0][1]]).result()
+
+        overlap = int(self.overlap_seconds * SAMPLE_RATE)
+        futures = []
+        for start, end in ranges:
+            padded_start = max(0, start - overlap)
+            samples = audio[padded_start : min(len(audio), end + overlap)]
+            futures.append(pool.submit(_transcribe_chunk, samples, padded_start / SAMPLE_RATE, language))
+        chunks = ((start / SAMPLE_RATE, end / SAMPLE_RATE, future.result()) for (start, end), future in zip(ranges, futures))
+        yield from stitch(chunks)
+
+    def transcribe(self, audio, language=None):
+        """Transcribes a path or 16 kHz samples; returns a dict with the text and segments like model.transcribe()"""
+        segments = list(self.iter_transcribe(audio, language))
+        return {"text": " ".join(segment["text"] for segment in segments), "segments": segments}
+
+    def close(self):
+        with self.lock:
+            if self.pool is not None:
+                self.pool.shutdown()
+                self.pool = None
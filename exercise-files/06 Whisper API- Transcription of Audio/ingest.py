@@ -0,0 +1,65 @@
+# Decoding of uploaded audio straight from memory, without writing the upload to disk
+import os
+import subprocess
+import tempfile
+import numpy as np
+from whisper.audio import SAMPLE_RATE
+
+
+def _ffmpeg(source, data=None):
+    """Runs ffmpeg on `source` (a path, or pipe:0 with `data` as its input) and returns 16 kHz mono float32 samples"""
+    # the same conversion as whisper.load_audio(): signed 16-bit PCM on stdout
+    command = ["ffmpeg", "-nostdin", "-threads", "0", "-i", source, "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(SAMPLE_RATE), "-"]
+    output = subprocess.run(command, input=data, capture_output=True, check=True).stdout
+    return np.frombuffer(output, np.int16).astype(np.float32) / 32768.0
+
+
+def index_at_end(data):
+    """True for an MP4/M4A/MOV file whose index (moov box) comes after the media data, which ffmpeg cannot read from a pipe"""
+    if data[4:8] != b"ftyp":
+        return False
+    position = 0
+    while position + 8 <= len(data):
+        size, kind = int.from_bytes(data[position : position + 4], "big"), data[position + 4 : position + 8]
+        if kind == b"moov":
+            return False
+        if kind == b"mdat":
+            return True
+        if size == 1:  # 64-bit box size
+            size = int.from_bytes(data[position + 8 : position + 16], "big")
+        if size < 8:
+            return False
+        position += size
+    return False
+
+
+def decode_audio(data, suffix=""):
+    """
+    Decodes the bytes of an audio file into the samples Whisper takes, like whisper.load_audio() does for a path.
+
+    The bytes are piped into ffmpeg and the samples read back from its
+    output, so nothing is written to disk. Files that cannot be read from a
+    pipe (MP4/M4A with the index at the end, recognized up front) are
+    written to a temporary folder that is removed as soon as they are
+    decoded.
+    """
+    if not index_at_end(data):
+        try:
+            audio = _ffmpeg("pipe:0", data)
+            if len(audio):
+                return audio
+        except subprocess.CalledProcessError:
+            pass
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "upload" + suffix)
+        with open(path, "wb") as file:
+            file.write(data)
+        try:
+            return _ffmpeg(path)
+        except subprocess.CalledProcessError as e:
+            raise RuntimeError(f"Failed to load audio: {e.stderr.decode()}") from e
+
+
+def load_upload(uploaded_file):
+    """Samples of a Streamlit upload"""
+    return decode_audio(uploaded_file.getvalue(), os.path.splitext(uploaded_file.name)[1])
@@ -2,11 +2,14 @@
 # https://github.com/openai/whisper
 # Import necessary libraries
 import streamlit as st  # Streamlit for creating web applications
-import tempfile  # For creating temporary files
 import openai  # OpenAI API client library for interacting with Whisper model
 import os  # For environment variable handling
 from dotenv import load_dotenv  # For loading environment variables from a .env file
-from utils import speech_to_text  # Custom utility function for converting speech to text
+import threading  # For loading the model in the background
+import time  # For measuring the time to the first segment
+from whisper.utils import format_timestamp  # For displaying segment timestamps
+from ingest import load_upload  # For decoding uploads in memory
+from utils import MODEL_SIZE, registry, stream_speech_to_text  # Custom utility functions for converting speech to text
 
 # Load environment variables from the .env file
 load_dotenv()
@@ -17,6 +20,21 @@ openai.api_key = os.getenv("OPENAI_API_KEY")
 # Streamlit App setup
 st.title("Audio transcription")  # Set the title of the Streamlit application
 
+
+@st.cache_resource  # Runs once per server process, not on every rerun
+def warm_model():
+    """Starts loading the Whisper model in the background so the first upload does not wait for it"""
+    threading.Thread(target=registry.warm, args=(MODEL_SIZE,), daemon=True).start()
+
+
+warm_model()
+
+# Sidebar: model load time and process memory, for monitoring
+model_stats = registry.stats()
+st.sidebar.metric("Process memory (RSS)", f"{model_stats['rss_mib']} MiB")
+for name, model in model_stats["models"].items():
+    st.sidebar.caption(f"{name}: loaded in {model['load_seconds']}s, {model['parameters_mib']} MiB, used {model['uses']}x")
+
 # Custom CSS styling for the blue button
 st.markdown(
     """
@@ -39,14 +57,26 @@ with st.form("user_form", clear_on_submit=True):
 # Process the uploaded file when the user clicks the submit button
 if submit_button and uploaded_file is not None:
     with st.spinner("Transcribing..."):  # Display a spinner while processing
-        # Save the uploaded file to a temporary location
-        with tempfile.NamedTemporaryFile(
-            delete=False, suffix=os.path.splitext(uploaded_file.name)[1]
-        ) as temp_file:
-            temp_file.write(uploaded_file.getvalue())  # Write the uploaded file content to the temp file
-            temp_file_path = temp_file.name  # Get the path of the temporary file
-            transcript = speech_to_text(temp_file_path)  # Convert speech to text using a custom function
+        # Convert speech to text, showing each segment as soon as it is decoded
+        started = time.perf_counter()
+        first_segment = None
+        st.divider()  # Add a visual divider on the screen
+        try:
+            # Decode the upload in memory: no temporary file is written or left behind
+            audio = load_upload(uploaded_file)
+            # Each segment is also written to the transcript file as it comes
+            for segment in stream_speech_to_text(audio, f"transcriptions/{uploaded_file.name}.txt"):
+                if first_segment is None:
+                    first_segment = time.perf_counter() - started  # Time to the first segment
+                # Display the segment's timestamps and its text in blue
+                st.markdown(
+                    f"`{format_timestamp(segment['start'])} - {format_timestamp(segment['end'])}` :blue[{segment['text']}]"
+                )
+        except Exception as e:
+            st.error(f"An error occurred during transcription: {e}")
+        else:
             st.success("File transcribed successfully!")  # Display success message
-            st.divider()  # Add a visual divider on the screen
-            st.markdown(f":blue[{transcript}]")  # Display the transcription in blue text
-            st.audio(temp_file_path)  # Add an audio player for listening to the uploaded file
\ No newline at end of file
+            if first_segment is not None:
+                st.caption(f"First segment after {first_segment:.1f}s, whole file after {time.perf_counter() - started:.1f}s")
+                print(f"Time to first segment: {first_segment:.2f}s")
+        st.audio(uploaded_file.getvalue(), format=uploaded_file.type)  # Add an audio player for listening to the uploaded file
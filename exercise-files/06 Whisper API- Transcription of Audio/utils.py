@@ -1,13 +1,27 @@
 import os
-import whisper
 import openai
+import whisper
 from dotenv import load_dotenv
+from chunked import ChunkedTranscriber, iter_borrowed_segments
+from models import ModelRegistry
+from vad import trim_silence
 
 load_dotenv()
 
 openai.api_key = os.getenv("OPENAI_API_KEY")
 client = openai.OpenAI()
 
+MODEL_SIZE = "base"
+# Whisper models are loaded once per process and shared by every session
+registry = ModelRegistry()
+
+# Recordings longer than this are split and transcribed on all cores (each worker process loads its own model)
+LONG_AUDIO_SECONDS = 5 * 60
+transcriber = ChunkedTranscriber(MODEL_SIZE, workers=os.cpu_count())
+
+# Cut silence and steady background sound (hold music) out before transcribing
+VAD_TRIM = True
+
 
 def save_file(text, file_name):
     """Saves content on a file"""
@@ -27,14 +41,64 @@ def speech_to_text(audio_path="media/audio.mp3"):
         if not os.path.exists(audio_path):
             raise FileNotFoundError("File not found")
 
-        # Initialize the Whisper ASR model
-        model = whisper.load_model("base")
-        
-        # Your code to transcribe the audio
-        result = model.transcribe(audio_path)["text"]
+        # Decode the audio once, keep only the speech, then pick the engine by its length
+        audio = whisper.load_audio(audio_path)
+        if VAD_TRIM:
+            audio, _ = trim_silence(audio)
+        if len(audio) > LONG_AUDIO_SECONDS * whisper.audio.SAMPLE_RATE:
+            result = transcriber.transcribe(audio)["text"]
+        else:
+            # Borrow the shared Whisper ASR model
+            with registry.use(MODEL_SIZE) as model:
+                # Your code to transcribe the audio
+                result = model.transcribe(audio)["text"]
 
         # Extract the transcript text from the result
         print(result)
+        return result
 
     except Exception as e:
         print(f"An error occurred during transcription: {e}")
+
+
+def iter_speech_segments(audio):
+    """Yields the segments of 16 kHz samples in order; with VAD_TRIM only the speech is transcribed, times still refer to `audio`"""
+    if not VAD_TRIM:
+        yield from _engine_segments(audio)
+        return
+    speech, offsets = trim_silence(audio)
+    if len(speech):
+        for segment in _engine_segments(speech):
+            yield offsets.remap(segment)
+
+
+def _engine_segments(audio):
+    # from the parallel engine for long recordings
+    if len(audio) > LONG_AUDIO_SECONDS * whisper.audio.SAMPLE_RATE:
+        # chunks are transcribed in parallel, segments arrive as the chunks before them finish
+        yield from transcriber.iter_transcribe(audio)
+    else:
+        # Borrow the shared Whisper ASR model piece by piece, it is not held while the segments are read
+        yield from iter_borrowed_segments(lambda: registry.use(MODEL_SIZE), audio)
+
+
+def stream_speech_to_text(audio, file_name):
+    """
+    Yields transcript segments (text, start and end in seconds) of a path or 16 kHz samples as soon as they are decoded.
+
+    Each segment is also appended to `file_name` and flushed right away,
+    so a run that stops halfway still leaves the part transcribed so far
+    on disk.
+    """
+    if isinstance(audio, str):
+        if not os.path.exists(audio):
+            raise FileNotFoundError("File not found")
+        audio = whisper.load_audio(audio)
+    if not os.path.exists("transcriptions"):
+        os.makedirs("transcriptions")
+
+    with open(file_name, "w") as file:
+        for segment in iter_speech_segments(audio):
+            file.write(segment["text"] + "\n")
+            file.flush()
+            yield segment
@@ -0,0 +1,211 @@
+# Batch transcription and translation of a folder of recordings
+# Usage: python batch_transcribe.py media/ --task transcribe --task translate --workers 2
+# Results are stored by audio content, so a renamed or copied file is never transcribed twice.
+# Interrupt at any time; running the same command again resumes where it stopped.
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import whisper
+from whisper.audio import SAMPLE_RATE
+from models import default_device
+from pipeline import transcribe_and_translate
+
+AUDIO_EXTENSIONS = {".flac", ".m4a", ".mp3", ".mp4", ".mpeg", ".mpga", ".ogg", ".wav", ".webm"}
+TASKS = ("transcribe", "translate")
+
+
+def find_audio(directory):
+    """Yields the audio files under `directory`, in a stable order"""
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() in AUDIO_EXTENSIONS:
+                yield os.path.join(root, name)
+
+
+def file_hash(path, block_size=1024 * 1024):
+    """SHA-256 of the file's content"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def result_path(output_dir, sha256, model_name, task):
+    return os.path.join(output_dir, f"{sha256}.{model_name}.{task}.txt")
+
+
+def write_atomic(path, text):
+    # write-then-rename, so an interrupted run never leaves a half-written file behind
+    temporary = path + ".tmp"
+    with open(temporary, "w", encoding="utf-8") as file:
+        file.write(text)
+    os.replace(temporary, path)
+
+
+def load_manifest(path):
+    if not os.path.exists(path):
+        return {"files": {}, "jobs": {}}
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def save_manifest(path, manifest):
+    write_atomic(path, json.dumps(manifest, indent=1))
+
+
+def hash_files(paths, manifest):
+    """Returns {path: sha256}, reusing the manifest's hash of files whose size and mtime have not changed"""
+    hashes = {}
+    for path in paths:
+        stat = os.stat(path)
+        known = manifest["files"].get(path)
+        if known and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+            hashes[path] = known["sha256"]
+        else:
+            hashes[path] = file_hash(path)
+            manifest["files"][path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": hashes[path]}
+    return hashes
+
+
+# In each worker process: one model, loaded when the process starts
+_model = None
+
+
+def _load_model(model_name, device, threads):
+    global _model
+    import torch
+
+    torch.set_num_threads(threads)  # the workers share the cores instead of all using every one
+    _model = whisper.load_model(model_name, device=device)
+
+
+def _run_job(path, tasks):
+    """Returns ({task: text}, audio seconds, processing seconds) for one recording"""
+    started = time.perf_counter()
+    audio = whisper.load_audio(path)
+    if set(tasks) == set(TASKS):
+        # both from one decode of the audio and one encoder pass
+        result = transcribe_and_translate(_model, audio)
+        texts = {"transcribe": result["text"], "translate": result["translation"]}
+    else:
+        fp16 = _model.device.type == "cuda"
+        texts = {task: _model.transcribe(audio, task=task, fp16=fp16)["text"] for task in tasks}
+    return texts, len(audio) / SAMPLE_RATE, time.perf_counter() - started
+
+
+def run_batch(directory, output_dir, model_name="base", tasks=("transcribe",), workers=1, device=None, retry_failed=False):
+    """
+    Transcribes (and/or translates) every recording under `directory` into `output_dir`.
+
+    Each result is stored as <sha256>.<model>.<task>.txt, and a (content,
+    model, task) whose file exists is skipped, so identical recordings
+    under different names are transcribed once. The manifest in
+    `output_dir` remembers file hashes (by size and mtime) and each job's
+    status and timing; it is saved after every finished job, so an
+    interrupted run picks up the remaining jobs when started again. A
+    recording that failed in an earlier run (e.g. a corrupt file) is not
+    tried again unless `retry_failed` is set.
+
+    Returns:
+        dict: A summary with counts and throughput.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, "manifest.json")
+    manifest = load_manifest(manifest_path)
+    device = device or default_device()
+
+    paths = list(find_audio(directory))
+    hashes = hash_files(paths, manifest)
+    # one job per distinct content, with the tasks it still needs
+    jobs = {}
+    failed_before = set()
+    for path, sha256 in hashes.items():
+        missing = [task for task in tasks if not os.path.exists(result_path(output_dir, sha256, model_name, task))]
+        if not missing or sha256 in jobs:
+            continue
+        previous = manifest["jobs"].get(f"{sha256}.{model_name}", {})
+        if previous.get("status") == "failed" and not retry_failed:
+            failed_before.add(sha256)
+        else:
+            jobs[sha256] = (path, missing)
+    for sha256, (path, missing) in jobs.items():
+        manifest["jobs"][f"{sha256}.{model_name}"] = {"path": path, "tasks": missing, "status": "pending"}
+    save_manifest(manifest_path, manifest)
+    print(f"{len(paths)} files, {len(set(hashes.values()))} distinct, {len(jobs)} to do with whisper {model_name} on {device}")
+    if failed_before:
+        print(f"{len(failed_before)} failed in an earlier run and are left out (--retry-failed to try them again)")
+
+    done = failed = 0
+    audio_seconds = 0.0
+    started = time.perf_counter()
+    if jobs:
+        threads = max(1, os.cpu_count() // workers)
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            # torch does not survive a fork once its threads have started
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_load_model,
+            initargs=(model_name, device, threads),
+        ) as pool:
+            futures = {pool.submit(_run_job, path, missing): sha256 for sha256, (path, missing) in jobs.items()}
+            for future in as_completed(futures):
+                sha256 = futures[future]
+                path, missing = jobs[sha256]
+                job = manifest["jobs"][f"{sha256}.{model_name}"]
+                try:
+                    texts, seconds, elapsed = future.result()
+                except Exception as e:
+                    failed += 1
+                    job.update(status="failed", error=str(e))
+                    print(f"[{done + failed}/{len(jobs)}] {path}: failed ({e})")
+                else:
+                    for task, text in texts.items():
+                        write_atomic(result_path(output_dir, sha256, model_name, task), text)
+                    done += 1
+                    audio_seconds += seconds
+                    job.update(status="done", audio_seconds=round(seconds, 2), seconds=round(elapsed, 2), error=None)
+                    # a recording with no samples has no real-time factor
+                    print(f"[{done + failed}/{len(jobs)}] {path}: {'+'.join(missing)}, "
+                          f"{seconds:.0f}s of audio in {elapsed:.1f}s (RTF {elapsed / (seconds or float('nan')):.2f})")
+                save_manifest(manifest_path, manifest)
+
+    elapsed = time.perf_counter() - started
+    return {
+        "files": len(paths),
+        "distinct": len(set(hashes.values())),
+        "skipped": len(set(hashes.values())) - len(jobs) - len(failed_before),
+        "transcribed": done,
+        "failed": failed,
+        "failed_before": len(failed_before),
+        "audio_seconds": round(audio_seconds, 1),
+        "elapsed": round(elapsed, 1),
+        "audio_seconds_per_second": round(audio_seconds / elapsed, 2) if done else 0.0,
+        "files_per_minute": round(done / elapsed * 60, 2) if done else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transcribe and/or translate every recording in a folder")
+    parser.add_argument("directory", help="Folder searched (recursively) for audio files")
+    parser.add_argument("--output", default="transcriptions/batch", help="Folder the results and manifest are written to")
+    parser.add_argument("--model", default="base", help="Whisper model size")
+    parser.add_argument("--task", action="append", choices=TASKS, help="transcribe and/or translate (default: transcribe)")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes, each with its own copy of the model")
+    parser.add_argument("--device", default=None, help="cpu or cuda (default: cuda when available)")
+    parser.add_argument("--retry-failed", action="store_true", help="Try again the recordings that failed in an earlier run")
+    args = parser.parse_args()
+
+    summary = run_batch(
+        args.directory, args.output, args.model, args.task or ["transcribe"], args.workers, args.device, args.retry_failed
+    )
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
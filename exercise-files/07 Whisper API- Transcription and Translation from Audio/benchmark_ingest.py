@@ -0,0 +1,68 @@
+# Benchmark: decoding an upload from a leaked temporary file (as main.py did) vs from memory
+# Usage: python benchmark_ingest.py [audio files...] (defaults: the testimonials in media/, plus an M4A copy of the first)
+import glob
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import whisper
+from ingest import decode_audio
+
+UPLOADS = 5  # per file
+
+
+def disk_writes():
+    """Bytes this process has sent to storage so far (0 where /proc is not available)"""
+    try:
+        with open("/proc/self/io") as file:
+            return next(int(line.split()[1]) for line in file if line.startswith("write_bytes"))
+    except OSError:
+        return 0
+
+
+def temp_files():
+    return {entry.path: entry.stat().st_size for entry in os.scandir(tempfile.gettempdir()) if entry.is_file()}
+
+
+def old_path(data, suffix):
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
+        temp_file.write(data)
+        temp_file.flush()
+        return whisper.load_audio(temp_file.name)
+
+
+def new_path(data, suffix):
+    return decode_audio(data, suffix)
+
+
+def measure(label, decode, data, suffix):
+    before_files, before_writes = temp_files(), disk_writes()
+    started = time.perf_counter()
+    for _ in range(UPLOADS):
+        samples = decode(data, suffix)
+    latency = (time.perf_counter() - started) / UPLOADS
+    left = {path: size for path, size in temp_files().items() if path not in before_files}
+    print(f"  {label:<18} {latency * 1000:7.1f} ms/upload   disk writes {(disk_writes() - before_writes) / 2**20:6.1f} MiB   "
+          f"temp files left {len(left)} ({sum(left.values()) / 2**20:.1f} MiB)")
+    for path in left:
+        os.remove(path)
+    return samples
+
+
+if __name__ == "__main__":
+    paths = sys.argv[1:] or sorted(glob.glob("media/*.mp3"))
+    with tempfile.TemporaryDirectory() as scratch:
+        if not sys.argv[1:]:
+            # AAC in MP4 with the index at the end cannot be read from a pipe, so it goes through the fallback
+            m4a = os.path.join(scratch, "testimonial.m4a")
+            subprocess.run(["ffmpeg", "-nostdin", "-loglevel", "error", "-i", paths[0], "-c:a", "aac", m4a], check=True)
+            paths.append(m4a)
+        for path in paths:
+            with open(path, "rb") as file:
+                data = file.read()
+            suffix = os.path.splitext(path)[1]
+            print(f"{os.path.basename(path)} ({len(data) / 2**20:.1f} MiB), {UPLOADS} uploads")
+            old = measure("temp file (old)", old_path, data, suffix)
+            new = measure("in memory", new_path, data, suffix)
+            print(f"  same samples: {len(old) == len(new) and bool((old == new).all())}")
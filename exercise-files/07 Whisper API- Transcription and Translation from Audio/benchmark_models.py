@@ -0,0 +1,39 @@
+# Benchmark: model loading per call (two loads per upload, as before) vs the shared registry
+# Usage: python benchmark_models.py [model size]
+import sys
+import time
+import whisper
+from models import ModelRegistry, default_device, rss_bytes
+
+UPLOADS = 3
+
+
+def timed(label, call):
+    started = time.perf_counter()
+    for _ in range(UPLOADS):
+        call()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<30} {elapsed:7.2f}s for {UPLOADS} uploads   RSS {rss_bytes() / 2**20:6.0f} MiB")
+
+
+if __name__ == "__main__":
+    name = sys.argv[1] if len(sys.argv) > 1 else "base"
+    device = default_device()
+    print(f"whisper {name} on {device}, RSS at start {rss_bytes() / 2**20:.0f} MiB\n")
+
+    def load_twice():
+        # speech_to_text() and speech_to_translation() each loaded their own copy
+        for _ in range(2):
+            whisper.load_model(name, device=device)
+
+    registry = ModelRegistry()
+
+    def borrow_twice():
+        for _ in range(2):
+            with registry.use(name, device):
+                pass
+
+    timed("load_model per call (old)", load_twice)
+    # the first borrow loads the model, every later one reuses it
+    timed("shared registry", borrow_twice)
+    print(f"\n{registry.stats()}")
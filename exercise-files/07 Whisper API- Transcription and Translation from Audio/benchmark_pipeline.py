@@ -0,0 +1,57 @@
+# Benchmark: transcription + translation as two transcribe() calls vs the single-decode pipeline
+# Usage: python benchmark_pipeline.py [model size] [audio files...] (defaults: base, the testimonials in media/)
+import glob
+import resource
+import sys
+import time
+import whisper
+from pipeline import transcribe_and_translate
+
+
+def cpu_seconds():
+    # this process plus finished children, i.e. the ffmpeg decodes
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime
+
+
+def two_pass(model, path):
+    # what speech_to_text() and speech_to_translation() do one after the other
+    return model.transcribe(path)["text"], model.transcribe(path, task="translate")["text"]
+
+
+def single_decode(model, path):
+    result = transcribe_and_translate(model, path)
+    return result["text"], result["translation"]
+
+
+def measure(label, run, model, path, counter):
+    counter[0] = 0
+    wall, cpu = time.perf_counter(), cpu_seconds()
+    text, translation = run(model, path)
+    wall, cpu = time.perf_counter() - wall, cpu_seconds() - cpu
+    print(f"  {label:<22} wall {wall:6.2f}s   cpu {cpu:6.2f}s   encoder passes {counter[0]:3}")
+    return wall, cpu, translation
+
+
+if __name__ == "__main__":
+    name = sys.argv[1] if len(sys.argv) > 1 else "base"
+    paths = sys.argv[2:] or sorted(glob.glob("media/*.mp3"))
+    model = whisper.load_model(name)
+    counter = [0]
+    model.encoder.register_forward_hook(lambda *args: counter.__setitem__(0, counter[0] + 1))
+    print(f"whisper {name} on {model.device}\n")
+
+    totals = {"two passes": [0.0, 0.0], "single decode": [0.0, 0.0]}
+    for path in paths:
+        duration = len(whisper.load_audio(path)) / whisper.audio.SAMPLE_RATE
+        print(f"{path} ({duration:.0f}s of audio)")
+        for label, run in (("two passes", two_pass), ("single decode", single_decode)):
+            wall, cpu, translation = measure(label, run, model, path, counter)
+            totals[label][0] += wall
+            totals[label][1] += cpu
+            print(f"    {translation[:100]!r}")
+
+    (old_wall, old_cpu), (new_wall, new_cpu) = totals.values()
+    print(f"\ntotal: two passes {old_wall:.2f}s wall / {old_cpu:.2f}s cpu, "
+          f"single decode {new_wall:.2f}s wall / {new_cpu:.2f}s cpu "
+          f"({1 - new_wall / old_wall:.0%} less wall time, {1 - new_cpu / old_cpu:.0%} less cpu time)")
@@ -0,0 +1,30 @@
+# Benchmark: time until the first text can be shown, whole-file transcribe_and_translate() vs streamed windows
+# Usage: python benchmark_streaming.py [model size] [audio files...] (defaults: base, the testimonials in media/)
+import glob
+import sys
+import time
+import whisper
+from whisper.audio import SAMPLE_RATE
+from pipeline import iter_transcribe_and_translate
+
+if __name__ == "__main__":
+    name = sys.argv[1] if len(sys.argv) > 1 else "base"
+    paths = sys.argv[2:] or sorted(glob.glob("media/*.mp3"))
+    model = whisper.load_model(name)
+    print(f"whisper {name} on {model.device}\n")
+
+    for path in paths:
+        audio = whisper.load_audio(path)
+        print(f"{path} ({len(audio) / SAMPLE_RATE:.0f}s of audio)")
+
+        # the whole file first, as main.py did before
+        started = time.perf_counter()
+        list(iter_transcribe_and_translate(model, audio))
+        whole = time.perf_counter() - started
+        print(f"  whole file         first text {whole:6.2f}s   complete {whole:6.2f}s")
+
+        started, first, count = time.perf_counter(), None, 0
+        for window in iter_transcribe_and_translate(model, audio):
+            first = first or time.perf_counter() - started
+            count += 1
+        print(f"  streamed windows   first text {first or 0:6.2f}s   complete {time.perf_counter() - started:6.2f}s   ({count} windows)")
@@ -0,0 +1,80 @@
+# Benchmark: compute saved and accuracy with voice-activity trimming before Whisper
+# Usage: python benchmark_vad.py [model size] (default: base)
+# Each testimonial in media/ is run as recorded and wrapped in hold music, silence and hiss, like a call recording.
+# Accuracy is the word error rate against the saved transcripts in transcriptions/.
+import glob
+import os
+import sys
+import time
+import numpy as np
+import whisper
+from whisper.audio import SAMPLE_RATE
+from pipeline import transcribe_and_translate
+from vad import trim_silence
+
+
+def hold_music(seconds):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    chord = sum(0.1 * np.sin(2 * np.pi * frequency * t) for frequency in (220, 277, 330))
+    return (chord * (0.8 + 0.2 * np.sin(2 * np.pi * 0.5 * t))).astype(np.float32)
+
+
+def as_call(audio):
+    hiss = 0.003 * np.random.default_rng(0).standard_normal(10 * SAMPLE_RATE).astype(np.float32)
+    return np.concatenate([hold_music(15), audio, np.zeros(20 * SAMPLE_RATE, np.float32), hiss])
+
+
+def word_error_rate(reference, hypothesis):
+    reference, hypothesis = reference.lower().split(), hypothesis.lower().split()
+    distances = list(range(len(hypothesis) + 1))
+    for i, word in enumerate(reference, start=1):
+        previous, distances[0] = distances[0], i
+        for j, other in enumerate(hypothesis, start=1):
+            previous, distances[j] = distances[j], min(distances[j] + 1, distances[j - 1] + 1, previous + (word != other))
+    return distances[-1] / max(1, len(reference))
+
+
+def run(model, audio, references, counter, vad):
+    counter[0] = 0
+    started = time.perf_counter()
+    if vad:
+        audio, _ = trim_silence(audio)
+    trimmed = time.perf_counter() - started
+    result = transcribe_and_translate(model, audio)
+    elapsed = time.perf_counter() - started
+    return {
+        "audio": len(audio) / SAMPLE_RATE,
+        "vad_ms": trimmed * 1000,
+        "seconds": elapsed,
+        "encoder": counter[0],
+        "wer": word_error_rate(references[0], result["text"]),
+        "wer_translation": word_error_rate(references[1], result["translation"]),
+    }
+
+
+if __name__ == "__main__":
+    name = sys.argv[1] if len(sys.argv) > 1 else "base"
+    model = whisper.load_model(name)
+    counter = [0]
+    model.encoder.register_forward_hook(lambda *args: counter.__setitem__(0, counter[0] + 1))
+    print(f"whisper {name} on {model.device}\n")
+
+    totals = {False: [0.0, 0.0], True: [0.0, 0.0]}
+    for path in sorted(glob.glob("media/*.mp3")):
+        base = os.path.join("transcriptions", os.path.basename(path))
+        with open(base + ".txt") as transcript, open(base + "_translated.txt") as translation:
+            references = transcript.read(), translation.read()
+        recorded = whisper.load_audio(path)
+        for label, audio in ((os.path.basename(path), recorded), ("  as a call", as_call(recorded))):
+            print(f"{label} ({len(audio) / SAMPLE_RATE:.0f}s)")
+            for vad in (False, True):
+                r = run(model, audio, references, counter, vad)
+                totals[vad][0] += r["seconds"]
+                totals[vad][1] += r["audio"]
+                print(f"    {'VAD' if vad else 'no VAD':<7} {r['audio']:5.1f}s to Whisper (VAD {r['vad_ms']:4.1f} ms)   "
+                      f"{r['seconds']:6.2f}s   encoder passes {r['encoder']:2}   "
+                      f"WER {r['wer']:5.1%}   translation WER {r['wer_translation']:5.1%}")
+
+    (full, full_audio), (trimmed, trimmed_audio) = totals[False], totals[True]
+    print(f"\ntotal: {full_audio:.0f}s -> {trimmed_audio:.0f}s of audio, {full:.1f}s -> {trimmed:.1f}s "
+          f"({1 - trimmed / full:.0%} less compute)")
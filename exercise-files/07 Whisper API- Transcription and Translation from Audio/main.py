@@ -1,10 +1,13 @@
 # Import necessary libraries
 import streamlit as st  # Streamlit for building the web application
-import tempfile  # For creating temporary files
 import openai  # OpenAI client library for accessing AI models
 import os  # For handling environment variables
 from dotenv import load_dotenv  # For loading environment variables from a .env file
-from utils import speech_to_text, speech_to_translation, save_file  # Custom utility functions
+import threading  # For loading the model in the background
+import time  # For measuring the time to the first segment
+from whisper.utils import format_timestamp  # For displaying segment timestamps
+from ingest import load_upload  # For decoding uploads in memory
+from utils import MODEL_SIZE, registry, stream_speech_to_text_and_translation  # Custom utility functions
 
 # Load environment variables from the .env file
 load_dotenv()
@@ -15,6 +18,21 @@ openai.api_key = os.getenv("OPENAI_API_KEY")
 # Streamlit App setup
 st.title("Audio transcriptions & translations")  # Add a title to the application
 
+
+@st.cache_resource  # Runs once per server process, not on every rerun
+def warm_model():
+    """Starts loading the Whisper model in the background so the first upload does not wait for it"""
+    threading.Thread(target=registry.warm, args=(MODEL_SIZE,), daemon=True).start()
+
+
+warm_model()
+
+# Sidebar: model load time and process memory, for monitoring
+model_stats = registry.stats()
+st.sidebar.metric("Process memory (RSS)", f"{model_stats['rss_mib']} MiB")
+for name, model in model_stats["models"].items():
+    st.sidebar.caption(f"{name}: loaded in {model['load_seconds']}s, {model['parameters_mib']} MiB, used {model['uses']}x")
+
 # Custom CSS styling for blue button
 st.markdown(
     """
@@ -37,40 +55,33 @@ with st.form("user_form", clear_on_submit=True):
 # Process the uploaded file when the user clicks the submit button
 if submit_button and uploaded_file is not None:
     with st.spinner("Transcribing..."):  # Show a spinner while processing the file
-        # Save the uploaded file to a temporary file location
-        with tempfile.NamedTemporaryFile(
-            delete=False, suffix=os.path.splitext(uploaded_file.name)[1]
-        ) as temp_file:
-            temp_file.write(uploaded_file.getvalue())  # Write the content of the uploaded file to the temp file
-            temp_file_path = temp_file.name  # Get the path of the temporary file
-            filename = temp_file_path.split("/")[-1]  # Extract the filename from the path
-
-            # Transcribe the audio to text
-            original_transcript = speech_to_text(temp_file_path)  # Get the transcription of the audio file
-
-            # Translate the transcription into the target language
-            translated_transcript = speech_to_translation(temp_file_path)  # Get the translated transcription
-
-            # Save the original transcription to a file
-            save_file(original_transcript, f"transcriptions/{uploaded_file.name}.txt")
-
-            # Save the translated transcription to a file
-            save_file(
-                translated_transcript,
+        # Transcribe the audio and translate it into English window by window, in one pass over the audio
+        started = time.perf_counter()
+        first_segment = None
+        st.divider()  # Add a visual divider
+        try:
+            # Decode the upload in memory: no temporary file is written or left behind
+            audio = load_upload(uploaded_file)
+            for window in stream_speech_to_text_and_translation(
+                audio,
+                f"transcriptions/{uploaded_file.name}.txt",  # Each window is written to the files as it comes
                 f"transcriptions/{uploaded_file.name}_translated.txt",
-            )
-
-            # Display success message and transcription results
+            ):
+                if first_segment is None:
+                    first_segment = time.perf_counter() - started  # Time to the first segment
+                # Display the window's timestamps, the original transcript in blue and the translation in green
+                st.markdown(
+                    f"`{format_timestamp(window['start'])} - {format_timestamp(window['end'])}` "
+                    f":blue[{window['text']}]  \n:green[{window['translation']}]"
+                )
+        except Exception as e:
+            st.error(f"An error occurred during transcription: {e}")
+        else:
+            # Display success message and how long the first segment and the whole file took
             st.success("File transcribed successfully!")  # Display success notification
-            st.divider()  # Add a visual divider
-
-            # Display the original transcript in blue text
-            st.markdown(f":blue `{original_transcript}`")  
-
-            st.divider()  # Add another visual divider
-
-            # Display the translated transcript in green text
-            st.markdown(f":green `{translated_transcript}`")  
+            if first_segment is not None:
+                st.caption(f"First segment after {first_segment:.1f}s, whole file after {time.perf_counter() - started:.1f}s")
+                print(f"Time to first segment: {first_segment:.2f}s")
 
-            # Add an audio player to listen to the uploaded audio file
-            st.audio(temp_file_path)  
\ No newline at end of file
+        # Add an audio player to listen to the uploaded audio file
+        st.audio(uploaded_file.getvalue(), format=uploaded_file.type)
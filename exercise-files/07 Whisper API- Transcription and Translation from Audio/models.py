@@ -0,0 +1,209 @@
+# Process-wide registry of loaded Whisper models
+import gc
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+import whisper
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Parameters of each model family (from the Whisper README), for models whose checkpoint is not on disk yet
+PARAMETERS = {"tiny": 39e6, "base": 74e6, "small": 244e6, "medium": 769e6, "turbo": 809e6, "large": 1550e6}
+
+
+def rss_bytes():
+    """Resident memory of this process (peak RSS where /proc is not available, 0 where neither is)"""
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        if resource is None:
+            return 0
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def default_device():
+    import torch
+
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def estimate_bytes(name):
+    """Size of a model's parameters once loaded, estimated before loading it (0 if unknown)"""
+    path = name
+    if name in whisper._MODELS:
+        # where whisper.load_model() downloads it to
+        root = os.path.join(os.getenv("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")), "whisper")
+        path = os.path.join(root, os.path.basename(whisper._MODELS[name]))
+    if os.path.isfile(path):
+        # checkpoints hold float16 weights, which are loaded as float32
+        return 2 * os.path.getsize(path)
+    family = "turbo" if "turbo" in name else name.split(".")[0].split("-")[0]
+    return int(4 * PARAMETERS.get(family, 0))
+
+
+class LoadedModel:
+    def __init__(self, model, load_seconds, rss_delta):
+        self.model = model
+        self.load_seconds = load_seconds
+        self.rss_delta = rss_delta
+        self.bytes = sum(p.numel() * p.element_size() for p in model.parameters())
+        self.lock = threading.Lock()  # one transcription at a time per model
+        self.users = 0
+        self.last_used = time.monotonic()
+        self.uses = 0
+
+
+class ModelRegistry:
+    """
+    Loads each (model size, device) once per process and lends it out to callers.
+
+    `use()` hands out a model for the duration of a `with` block. Calls on the
+    same model are serialized: Whisper's decoder installs hooks on the model
+    while it runs, so two transcriptions must not share it at the same time.
+    Loading is also locked per model, so sessions that start together trigger
+    a single load. With `max_bytes`, idle models (least recently used first)
+    are unloaded to make room for the size of the next one before it is
+    loaded. While any model is loaded, a background thread unloads those not
+    used for `idle_ttl` seconds, whether or not requests keep coming.
+    """
+
+    def __init__(self, max_bytes=None, idle_ttl=30 * 60, loader=whisper.load_model):
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.loader = loader
+        self.models = {}  # (name, device) -> LoadedModel
+        self.loading = {}  # (name, device) -> lock held while that model loads
+        self.lock = threading.Lock()
+        self.evictions = 0
+        self.sizes = {}  # name -> parameter bytes measured when it was last loaded
+        self.sweeper = None  # thread running evict_idle() while models are loaded
+
+    def get(self, name="base", device=None):
+        """Returns the loaded entry for a model, loading it on first use"""
+        key = (name, device or default_device())
+        self.evict_idle(keep=key)
+        with self.lock:
+            entry = self.models.get(key)
+            if entry is not None:
+                return entry
+            load_lock = self.loading.setdefault(key, threading.Lock())
+        with load_lock:
+            with self.lock:
+                entry = self.models.get(key)
+            if entry is None:
+                entry = self._load(key)
+        return entry
+
+    def _load(self, key):
+        name, device = key
+        if self.max_bytes is not None:
+            self._make_room(self.sizes.get(name) or estimate_bytes(name))
+        rss_before = rss_bytes()
+        started = time.perf_counter()
+        model = self.loader(name, device=device)
+        entry = LoadedModel(model, time.perf_counter() - started, rss_bytes() - rss_before)
+        print(f"Loaded whisper {name} on {device} in {entry.load_seconds:.1f}s (+{entry.rss_delta / 2**20:.0f} MiB RSS)")
+        with self.lock:
+            self.models[key] = entry
+            self.sizes[name] = entry.bytes
+            if self.idle_ttl is not None and self.sweeper is None:
+                self.sweeper = threading.Thread(target=self._sweep, daemon=True)
+                self.sweeper.start()
+        return entry
+
+    @contextmanager
+    def use(self, name="base", device=None):
+        """Lends a model for a `with` block; it cannot be evicted while in use"""
+        while True:
+            entry = self.get(name, device)
+            with self.lock:
+                # it may have been evicted between get() and here
+                if entry in self.models.values():
+                    entry.users += 1
+                    break
+        try:
+            with entry.lock:
+                yield entry.model
+        finally:
+            with self.lock:
+                entry.users -= 1
+                entry.uses += 1
+                entry.last_used = time.monotonic()
+
+    def warm(self, *names, device=None):
+        """Loads models ahead of the first request, e.g. at server start"""
+        for name in names:
+            self.get(name, device)
+
+    def _unload(self, key):
+        # called with self.lock held
+        del self.models[key]
+        self.evictions += 1
+        gc.collect()
+        if key[1].startswith("cuda"):
+            import torch
+
+            torch.cuda.empty_cache()
+
+    def _make_room(self, incoming):
+        """Unloads idle models, least recently used first, until `incoming` more bytes fit under max_bytes"""
+        with self.lock:
+            idle = sorted(
+                ((key, entry) for key, entry in self.models.items() if entry.users == 0),
+                key=lambda item: item[1].last_used,
+            )
+            total = sum(entry.bytes for entry in self.models.values())
+            for key, entry in idle:
+                if total + incoming <= self.max_bytes:
+                    break
+                self._unload(key)
+                total -= entry.bytes
+
+    def evict_idle(self, keep=None):
+        """Unloads every model (but `keep`) that has not been used for idle_ttl seconds; returns how many"""
+        if self.idle_ttl is None:
+            return 0
+        now = time.monotonic()
+        with self.lock:
+            stale = [
+                key for key, entry in self.models.items()
+                if key != keep and entry.users == 0 and now - entry.last_used > self.idle_ttl
+            ]
+            for key in stale:
+                self._unload(key)
+        return len(stale)
+
+    def _sweep(self):
+        # checks a few times per idle_ttl, and stops once nothing is loaded (the next load starts it again)
+        while True:
+            time.sleep(min(60, self.idle_ttl / 4))
+            self.evict_idle()
+            with self.lock:
+                if not self.models:
+                    self.sweeper = None
+                    return
+
+    def stats(self):
+        """Load time, size and use count of each loaded model, and the process RSS"""
+        with self.lock:
+            return {
+                "rss_mib": round(rss_bytes() / 2**20),
+                "evictions": self.evictions,
+                "models": {
+                    f"{name}/{device}": {
+                        "load_seconds": round(entry.load_seconds, 2),
+                        "parameters_mib": round(entry.bytes / 2**20),
+                        "rss_delta_mib": round(entry.rss_delta / 2**20),
+                        "uses": entry.uses,
+                        "in_use": entry.users,
+                    }
+                    for (name, device), entry in self.models.items()
+                },
+            }
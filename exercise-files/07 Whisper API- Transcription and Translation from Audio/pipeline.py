@@ -0,0 +1,150 @@
+# Transcription and English translation of one recording from a single audio decode and encoder pass
+from contextlib import nullcontext
+import torch
+import whisper
+from whisper.audio import HOP_LENGTH, N_FRAMES, N_SAMPLES, SAMPLE_RATE
+from whisper.tokenizer import get_tokenizer
+
+# The same defaults as whisper's transcribe()
+TEMPERATURES = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOGPROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+
+
+def decode_with_fallback(model, features, **options):
+    """Greedy decode, retried at higher temperatures while the output is repetitive or improbable"""
+    for temperature in TEMPERATURES:
+        result = model.decode(features, whisper.DecodingOptions(temperature=temperature, **options))[0]
+        if result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD:
+            break  # silence, a retry would not help
+        if result.compression_ratio <= COMPRESSION_RATIO_THRESHOLD and result.avg_logprob >= LOGPROB_THRESHOLD:
+            break
+    return result
+
+
+def split_segments(tokens, timestamp_begin):
+    """Splits decoded tokens into (start, end, tokens) segments, positions in timestamp units; also returns whether speech ends inside the window"""
+    timestamps = [i for i, token in enumerate(tokens) if token >= timestamp_begin]
+    segments, start = [], None
+    for i in timestamps:
+        if start is None:
+            start = i
+        elif i > start + 1:
+            segments.append((tokens[start] - timestamp_begin, tokens[i] - timestamp_begin, tokens[start : i + 1]))
+            start = None
+        else:
+            start = i  # two timestamps in a row: the first one closed the previous segment
+    single_timestamp_ending = len(tokens) >= 2 and tokens[-1] >= timestamp_begin > tokens[-2]
+    return segments, single_timestamp_ending
+
+
+def new_segments(tokens, timestamp_begin, covered):
+    """
+    Returns the tokens of one task's decoded window that are new, and where the task goes on from.
+
+    `covered` is how far into the window (in timestamp units) the task got in
+    the window before; a segment is left out when most of it lies before
+    that point. The position returned is the end of the last complete
+    segment, or None when the task is done with the whole window.
+    """
+    segments, single_timestamp_ending = split_segments(tokens, timestamp_begin)
+    end = None
+    if segments and not single_timestamp_ending and segments[-1][1] > 0:
+        # speech goes on past the last complete segment: the task goes on from where that segment ends
+        end = segments[-1][1]
+    elif covered <= 0 or not segments:
+        return tokens, end
+    return [token for start, stop, segment in segments if (start + stop) / 2 >= covered for token in segment], end
+
+
+def iter_transcribe_and_translate(model, audio):
+    """
+    Transcribes `audio` (a path or 16 kHz samples) in its own language and translates it to English, window by window.
+
+    The audio is decoded and turned into a log-mel spectrogram once, and each
+    30 second window goes through the encoder once; the transcription and
+    the translation are both decoded from the same encoder output. Each task
+    goes on from the end of its own last complete segment, the way whisper's
+    transcribe() does, and the next window starts at the earlier of the two;
+    the task that got further leaves out what it decodes again, so neither
+    output skips or repeats speech.
+    Yields a dict per window, as soon as it is decoded, with its start and
+    end in seconds, the detected language, text and translation.
+    """
+    return iter_borrowed_transcribe_and_translate(lambda: nullcontext(model), audio)
+
+
+def iter_borrowed_transcribe_and_translate(borrow, audio):
+    """
+    Same as `iter_transcribe_and_translate`, with the model lent by `borrow()` (e.g. `lambda: registry.use("base")`) for each window.
+
+    The model is given back before the window is yielded, so a caller that
+    is slow to read the windows, or stops reading, does not keep it from
+    other requests or from being unloaded.
+    """
+    if isinstance(audio, str):
+        audio = whisper.load_audio(audio)
+    with borrow() as model:
+        n_mels = model.dims.n_mels
+        input_stride = N_FRAMES // model.dims.n_audio_ctx  # mel frames per timestamp unit
+    mel = whisper.log_mel_spectrogram(audio, n_mels, padding=N_SAMPLES)
+    content_frames = mel.shape[-1] - N_FRAMES
+    frames_per_second = SAMPLE_RATE / HOP_LENGTH
+
+    language, tokenizer = None, None
+    kept = {"transcribe": [], "translate": []}
+    covered = {"transcribe": 0, "translate": 0}  # mel frame each task got to
+    seek = 0
+    while seek < content_frames:
+        segment_size = min(N_FRAMES, content_frames - seek)
+        with borrow() as model:
+            fp16 = model.device.type == "cuda"
+            window = whisper.pad_or_trim(mel[:, seek : seek + segment_size], N_FRAMES).to(model.device)
+            with torch.no_grad():
+                features = model.embed_audio(window[None].half() if fp16 else window[None])
+            if language is None:
+                # detected once, on the first window, like transcribe()
+                language = "en"
+                if model.is_multilingual:
+                    _, probabilities = model.detect_language(features)
+                    language = max(probabilities[0], key=probabilities[0].get)
+                tokenizer = get_tokenizer(model.is_multilingual, num_languages=model.num_languages, language=language)
+
+            results = {
+                task: decode_with_fallback(model, features, task=task, language=language, fp16=fp16, prompt=tokens)
+                for task, tokens in kept.items()
+            }
+        transcription = results["transcribe"]
+        if transcription.no_speech_prob > NO_SPEECH_THRESHOLD and transcription.avg_logprob < LOGPROB_THRESHOLD:
+            seek += segment_size
+            covered = {task: max(frame, seek) for task, frame in covered.items()}
+            continue
+
+        new = {}
+        for task, result in results.items():
+            new[task], end = new_segments(result.tokens, tokenizer.timestamp_begin, (covered[task] - seek) / input_stride)
+            covered[task] = max(covered[task], seek + (segment_size if end is None else end * input_stride))
+        # the next window starts where the task that is further behind goes on
+        advance = min(covered.values()) - seek
+
+        for task, tokens in new.items():
+            kept[task] += tokens
+        yield {
+            "start": seek / frames_per_second,
+            "end": (seek + advance) / frames_per_second,
+            "language": language,
+            "text": tokenizer.decode(new["transcribe"]).strip(),
+            "translation": tokenizer.decode(new["translate"]).strip(),
+        }
+        seek += advance
+
+
+def transcribe_and_translate(model, audio):
+    """Transcribes and translates the whole of `audio`; returns a dict with the language, text and translation"""
+    windows = list(iter_transcribe_and_translate(model, audio))
+    return {
+        "language": windows[0]["language"] if windows else None,
+        "text": " ".join(window["text"] for window in windows if window["text"]),
+        "translation": " ".join(window["translation"] for window in windows if window["translation"]),
+    }
@@ -1,13 +1,23 @@
 import os
-import whisper
 import openai
+import whisper
 from dotenv import load_dotenv
+from models import ModelRegistry
+from pipeline import iter_borrowed_transcribe_and_translate, transcribe_and_translate
+from vad import trim_silence
 
 load_dotenv()
 
 openai.api_key = os.getenv("OPENAI_API_KEY")
 client = openai.OpenAI()
 
+MODEL_SIZE = "base"
+# Whisper models are loaded once per process and shared by every session
+registry = ModelRegistry()
+
+# Cut silence and steady background sound (hold music) out before transcribing
+VAD_TRIM = True
+
 
 def save_file(text, file_name):
     """Saves content on a file"""
@@ -22,16 +32,22 @@ def save_file(text, file_name):
     print(f"Content saved to {file_name}")
 
 
+def open_transcript(file_name):
+    """Opens a transcript file for writing as the transcription goes, one segment per line"""
+    if not os.path.exists("transcriptions"):
+        os.makedirs("transcriptions")
+    return open(file_name, "w")
+
+
 def speech_to_text(audio_path="media/audio.mp3"):
     try:
         if not os.path.exists(audio_path):
             raise FileNotFoundError("File not found")
 
-        # Initialize the Whisper ASR model
-        model = whisper.load_model("base")
-
-        # Your code to transcribe the audio
-        result = model.transcribe(audio_path)
+        # Borrow the shared Whisper ASR model
+        with registry.use(MODEL_SIZE) as model:
+            # Your code to transcribe the audio
+            result = model.transcribe(audio_path)
 
         # Extract the transcript text from the result
         return result["text"]
@@ -45,13 +61,61 @@ def speech_to_translation(audio_path="media/audio.mp3"):
         if not os.path.exists(audio_path):
             raise FileNotFoundError("File not found")
 
-        # Initialize the Whisper ASR model
-        model = whisper.load_model("base")
-
-        # Your code to transcribe the audio to target language
-        result = model.transcribe(audio_path, language="en")
+        # Borrow the shared Whisper ASR model
+        with registry.use(MODEL_SIZE) as model:
+            # Your code to transcribe the audio to target language
+            result = model.transcribe(audio_path, task="translate")
 
         # Extract the transcript text from the result
         return result["text"]
     except Exception as e:
         print(f"An error occurred during transcription: {e}")
+
+
+def speech_to_text_and_translation(audio_path="media/audio.mp3"):
+    """Returns (transcript, English translation), decoding and encoding the audio only once for both"""
+    try:
+        if not os.path.exists(audio_path):
+            raise FileNotFoundError("File not found")
+
+        audio = whisper.load_audio(audio_path)
+        if VAD_TRIM:
+            audio, _ = trim_silence(audio)
+
+        # Borrow the shared Whisper ASR model
+        with registry.use(MODEL_SIZE) as model:
+            result = transcribe_and_translate(model, audio)
+
+        return result["text"], result["translation"]
+    except Exception as e:
+        print(f"An error occurred during transcription: {e}")
+        return None, None
+
+
+def stream_speech_to_text_and_translation(audio, transcript_file, translation_file):
+    """
+    Yields the transcript and English translation of a path or 16 kHz samples window by window, each as soon as it is decoded.
+
+    Each window's text and translation are also appended to the two files
+    and flushed right away, so a run that stops halfway still leaves the
+    part transcribed so far on disk.
+    """
+    if isinstance(audio, str):
+        if not os.path.exists(audio):
+            raise FileNotFoundError("File not found")
+        audio = whisper.load_audio(audio)
+    offsets = None
+    if VAD_TRIM:
+        # Only the speech is transcribed; window times are mapped back to the original recording
+        audio, offsets = trim_silence(audio)
+
+    # Borrow the shared Whisper ASR model window by window, it is not held while the windows are read
+    windows = iter_borrowed_transcribe_and_translate(lambda: registry.use(MODEL_SIZE), audio)
+    with open_transcript(transcript_file) as transcript, open_transcript(translation_file) as translation:
+        for window in windows:
+            if offsets is not None:
+                window = offsets.remap(window)
+            for file, text in ((transcript, window["text"]), (translation, window["translation"])):
+                file.write(text + "\n")
+                file.flush()
+            yield window
@@ -0,0 +1,108 @@
+# Voice-activity trimming: drops silence and steady background sound (hold music, tones) before Whisper sees the audio
+from bisect import bisect_left, bisect_right
+import numpy as np
+from whisper.audio import SAMPLE_RATE
+
+FRAME = SAMPLE_RATE * 30 // 1000  # 30 ms analysis frames
+ENERGY_MARGIN_DB = 10  # speech is at least this far above the recording's noise floor
+MIN_ENERGY_DB = -45  # and above this level (dB relative to full scale) in any case
+STEADY_SECONDS = 1.0  # window over which the energy and zero-crossing rate must vary for speech
+STEADY_ENERGY_DB = 3  # speech rises and falls with every syllable; music and tones stay within a few dB
+STEADY_CROSSINGS = 0.02  # and switch between voiced and unvoiced sounds, which moves the zero-crossing rate
+MIN_GAP_SECONDS = 0.5  # shorter pauses stay in, so words are not run together
+MIN_SPEECH_SECONDS = 0.25  # shorter bursts are clicks, not speech
+PAD_SECONDS = 0.2  # kept around each stretch of speech, for soft word onsets and endings
+
+
+def frame_features(audio):
+    """Energy (dBFS) and zero-crossing rate of each 30 ms frame"""
+    frames = audio[: len(audio) // FRAME * FRAME].reshape(-1, FRAME)
+    energy = 10 * np.log10(np.mean(frames**2, axis=1) + 1e-10)
+    crossings = np.mean(np.diff(np.signbit(frames), axis=1), axis=1)
+    return energy, crossings
+
+
+def rolling_std(values, width):
+    """Standard deviation over a centred window of `width` frames"""
+    # the ends are repeated rather than zero-padded, so a steady start or end still reads as steady
+    padded = np.pad(values, (width // 2, width - 1 - width // 2), mode="edge")
+    kernel = np.ones(width) / width
+    mean = np.convolve(padded, kernel, mode="valid")
+    return np.sqrt(np.maximum(np.convolve(padded**2, kernel, mode="valid") - mean**2, 0))
+
+
+def runs(mask):
+    """(start, end) frame indices of each run of True in `mask`"""
+    edges = np.flatnonzero(np.diff(np.concatenate(([False], mask, [False])).astype(np.int8)))
+    return list(zip(edges[::2], edges[1::2]))
+
+
+def speech_ranges(audio):
+    """
+    Returns (start, end) sample ranges of `audio` that hold speech.
+
+    A frame is speech when it is loud enough (above the recording's noise
+    floor and MIN_ENERGY_DB) and its surroundings are not steady: over a
+    second, speech energy and zero-crossing rate keep moving, while silence,
+    hum, tones and most hold music do not. Stretches closer than
+    MIN_GAP_SECONDS are joined, shorter than MIN_SPEECH_SECONDS dropped,
+    and each one is padded by PAD_SECONDS.
+    """
+    if len(audio) < FRAME:
+        return []
+    energy, crossings = frame_features(audio)
+    frames_per_second = SAMPLE_RATE / FRAME
+    width = max(1, int(STEADY_SECONDS * frames_per_second))
+    loud = energy > max(np.percentile(energy, 10) + ENERGY_MARGIN_DB, MIN_ENERGY_DB)
+    steady = (rolling_std(energy, width) < STEADY_ENERGY_DB) & (rolling_std(crossings, width) < STEADY_CROSSINGS)
+
+    ranges = []
+    for start, end in runs(loud & ~steady):
+        if ranges and start - ranges[-1][1] < MIN_GAP_SECONDS * frames_per_second:
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((start, end))
+    pad = int(PAD_SECONDS * SAMPLE_RATE)
+    padded = []
+    for start, end in ranges:
+        if end - start < MIN_SPEECH_SECONDS * frames_per_second:
+            continue
+        start, end = max(0, start * FRAME - pad), min(len(audio), end * FRAME + pad)
+        if padded and start <= padded[-1][1]:
+            padded[-1] = (padded[-1][0], end)
+        else:
+            padded.append((start, end))
+    return padded
+
+
+class OffsetMap:
+    """Maps times in trimmed audio back to times in the original recording"""
+
+    def __init__(self, ranges, original_samples):
+        self.trimmed_starts, self.original_starts = [], []
+        position = 0
+        for start, end in ranges:
+            self.trimmed_starts.append(position / SAMPLE_RATE)
+            self.original_starts.append(start / SAMPLE_RATE)
+            position += end - start
+        self.trimmed_seconds = position / SAMPLE_RATE
+        self.original_seconds = original_samples / SAMPLE_RATE
+
+    def original(self, seconds, end=False):
+        """Time in the original recording; an `end` time exactly at a join belongs to the range before it"""
+        if not self.trimmed_starts:
+            return seconds
+        find = bisect_left if end else bisect_right
+        i = max(0, find(self.trimmed_starts, seconds) - 1)
+        return self.original_starts[i] + seconds - self.trimmed_starts[i]
+
+    def remap(self, item):
+        """A copy of a segment (or any dict with start and end) with its times in the original recording"""
+        return {**item, "start": self.original(item["start"]), "end": self.original(item["end"], end=True)}
+
+
+def trim_silence(audio):
+    """Returns (speech-only samples, OffsetMap) for 16 kHz samples"""
+    ranges = speech_ranges(audio)
+    trimmed = np.concatenate([audio[start:end] for start, end in ranges]) if ranges else audio[:0]
+    return trimmed, OffsetMap(ranges, len(audio))
@@ -2,7 +2,8 @@ import streamlit as st
 import openai
 import os
 from dotenv import load_dotenv
-from main import query
+from main import stream_query
+from history import render_history
 
 load_dotenv()
 
@@ -22,13 +23,29 @@ def init_chat_history():
         ]
 
 
+def render_stream(chunks):
+    """Renders a streamed reply as it arrives and commits it to the history exactly once"""
+    placeholder = st.empty()
+    response = ""
+    try:
+        for chunk in chunks:
+            response += chunk
+            placeholder.markdown(response + "▌")
+        placeholder.markdown(response)
+    except Exception as e:
+        placeholder.markdown(response)
+        st.error(f"The reply was interrupted: {e}")
+    finally:
+        # also runs when a rerun stops the script mid-stream, so the partial reply is kept
+        chunks.close()
+        if response:
+            st.session_state.messages.append({"role": "assistant", "content": response})
+
+
 def start_chat():
-    # Display chat messages from history on app rerun
+    # Display the newest chat messages from history on app rerun
     with chat_placeholder.container():
-        for message in st.session_state.messages:
-            if message["role"] != "system":
-                with st.chat_message(message["role"]):
-                    st.markdown(message["content"])
+        render_history(st.session_state.messages, st.session_state)
 
     # Accept user input
     if prompt := st.chat_input("What is up?"):
@@ -39,14 +56,9 @@ def start_chat():
         with st.chat_message("user"):
             st.markdown(prompt)
 
-        # Generate response from Chat models
-        response = query(prompt)
-
-        # message_placeholder.markdown(response)
+        # Stream the response from Chat models into the assistant message
         with st.chat_message("assistant"):
-            st.markdown(response)
-        # Add assistant's response to chat history
-        st.session_state.messages.append({"role": "assistant", "content": response})
+            render_stream(stream_query(prompt))
 
 
 if __name__ == "__main__":
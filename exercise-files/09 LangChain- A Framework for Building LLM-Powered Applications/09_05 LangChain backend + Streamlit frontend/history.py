@@ -0,0 +1,38 @@
+# Windowed chat history: only the newest messages are rendered on each rerun
+import streamlit as st
+
+HISTORY_WINDOW = 20  # messages rendered, and revealed per "Show earlier messages" click
+
+
+def show_more(state, page_size, load_older=None):
+    if load_older is not None:
+        load_older()
+    state["history_visible"] = state.get("history_visible", page_size) + page_size
+
+
+def render_history(messages, state, page_size=HISTORY_WINDOW, load_older=None, has_older=False):
+    """
+    Renders the newest messages of a chat, oldest first, behind a "show earlier" control.
+
+    Only the last `page_size` messages are drawn, so a rerun costs the same
+    however long the conversation is; each click on the button reveals
+    `page_size` more. Once every message in `messages` is shown and
+    `has_older` is set, the button calls `load_older()` to page in messages
+    that are not in memory yet. `state` keeps the window size across reruns
+    (st.session_state in the app).
+    """
+    visible = state.get("history_visible", page_size)
+    first = 1 if messages and messages[0]["role"] == "system" else 0
+    start = max(first, len(messages) - visible)
+    hidden = start - first
+
+    if hidden:
+        st.button(f"Show earlier messages ({hidden} hidden)", on_click=show_more, args=(state, page_size))
+    elif has_older:
+        st.button("Load older messages", on_click=show_more, args=(state, page_size, load_older))
+
+    # slicing from the end touches only the visible messages
+    for message in messages[start:]:
+        if message["role"] != "system":
+            with st.chat_message(message["role"]):
+                st.markdown(message["content"])
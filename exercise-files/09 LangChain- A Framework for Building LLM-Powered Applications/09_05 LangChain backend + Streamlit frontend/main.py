@@ -75,8 +75,25 @@ def generate_response(retriever, query):
     return chain.invoke(query)
 
 
+def stream_response(retriever, query):
+    """Same chain as `generate_response`, yielding the answer piece by piece as it is generated."""
+    chain = (
+        {"context": retriever, "question": RunnablePassthrough()}
+        | chat_prompt_template
+        | model
+        | StrOutputParser()
+    )
+    return chain.stream(query)
+
+
 def query(query):
     documents = load_documents()
     retriever = load_embeddings(documents, query)
     response = generate_response(retriever, query)
     return response
+
+
+def stream_query(query):
+    documents = load_documents()
+    retriever = load_embeddings(documents, query)
+    yield from stream_response(retriever, query)